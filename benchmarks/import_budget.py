@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Import-time budgets for the Python entry points.
+
+Runs each entry point under `python -X importtime` and checks:
+
+    budget     import time beyond the bare interpreter stays under budget_ms
+    forbidden  heavy modules (PIL, pdf2image, openai, multiprocessing, ...)
+               are not imported on the cheap path at all
+
+Each entry point is measured --runs times after one warm-up run (which
+also writes the .pyc files), and the fastest run counts. Exits with status 1
+on any violation.
+
+Usage:
+    python3 benchmarks/import_budget.py
+    python3 benchmarks/import_budget.py --runs 10 --scale 2.0   # slow CI machines
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> cwd (relative to ROOT), code to run, budget, modules that must stay unloaded
+ENTRY_POINTS = {
+    'main': {
+        'cwd': 'python_engine',
+        'code': 'import main',
+        'budget_ms': 60,
+        'forbidden': ('socketserver', 'multiprocessing', 'concurrent.futures', 'price_index',
+                      'pyarrow', 'numpy', 'pypdf'),
+    },
+    'vision_client': {
+        'cwd': '.',
+        # Credentials are set, so an eager SDK client would show up here
+        'code': 'from django_ocr.utils.azure_openai_client import AzureOpenAIClient; AzureOpenAIClient()',
+        'budget_ms': 120,
+        'forbidden': ('PIL', 'pdf2image', 'openai', 'httpx'),
+    },
+}
+
+
+def _run(code, cwd, env):
+    """
+    Run code under -X importtime; returns (wall seconds, {level-0 module: cumulative us}, module names).
+    """
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode:
+        raise RuntimeError(f"{code!r} failed:\n{proc.stderr[-2000:]}")
+
+    top_level = {}
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        modules.add(name.strip())
+        # Nesting is shown as two extra spaces per level
+        if len(name) - len(name.lstrip()) == 1:
+            top_level[name.strip()] = int(cumulative)
+    return wall, top_level, modules
+
+
+def measure(entry, runs, env):
+    cwd = os.path.join(ROOT, entry['cwd'])
+    _run('pass', cwd, env)
+    _run(entry['code'], cwd, env)
+
+    bare_wall, bare_top, _ = min(_run('pass', cwd, env) for _ in range(runs))
+    best = None
+    for _ in range(runs):
+        wall, top_level, modules = _run(entry['code'], cwd, env)
+        import_us = sum(us for name, us in top_level.items() if name not in bare_top)
+        if best is None or import_us < best['import_us']:
+            best = {'import_us': import_us, 'wall': wall, 'top_level': top_level, 'modules': modules}
+    best['bare_wall'] = bare_wall
+    return best
+
+
+def is_loaded(module, modules):
+    return any(name == module or name.startswith(module + '.') for name in modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time budgets for python_engine / Vision client entry points')
+    parser.add_argument('--runs', type=int, default=5, help='Measured runs per entry point (fastest counts)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply every budget (slow machines)')
+    parser.add_argument('--only', choices=sorted(ENTRY_POINTS), action='append', help='Check only these entry points')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='import-budget-') as tmp:
+        env = dict(os.environ,
+                   AZURE_OPENAI_API_KEY='import-budget',
+                   AZURE_OPENAI_ENDPOINT='https://import-budget.invalid/',
+                   AZURE_VISION_CACHE_PATH=os.path.join(tmp, 'cache.sqlite3'),
+                   AZURE_VISION_LOCK_DIR=os.path.join(tmp, 'locks'))
+        env.pop('PYTHONPATH', None)
+
+        failures = 0
+        print(f"{'entry point':<16} {'imports':>10} {'budget':>10} {'wall':>10} {'bare':>10}")
+        for name in args.only or ENTRY_POINTS:
+            entry = ENTRY_POINTS[name]
+            result = measure(entry, max(1, args.runs), env)
+            budget_ms = entry['budget_ms'] * args.scale
+            import_ms = result['import_us'] / 1000
+            print(f"{name:<16} {import_ms:>8.1f}ms {budget_ms:>8.1f}ms "
+                  f"{result['wall'] * 1000:>8.1f}ms {result['bare_wall'] * 1000:>8.1f}ms")
+
+            problems = []
+            if import_ms > budget_ms:
+                problems.append(f"import time {import_ms:.1f}ms exceeds budget {budget_ms:.1f}ms")
+            loaded = [module for module in entry['forbidden'] if is_loaded(module, result['modules'])]
+            if loaded:
+                problems.append(f"imports {', '.join(loaded)} on the cheap path")
+            for problem in problems:
+                print(f"  OVER BUDGET: {problem}")
+            if problems:
+                failures += 1
+                slowest = sorted(result['top_level'].items(), key=lambda item: -item[1])[:5]
+                print('  slowest top-level imports: ' + ', '.join(f"{m} {us / 1000:.1f}ms" for m, us in slowest))
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Load driver for the Vision extraction path.
+
+Pushes documents through AzureOpenAIClient.extract_invoice_items_from_image,
+--concurrency documents at a time, against the offline simulator
+(vision_sim.py, started in-process unless --endpoint is given), and reports
+throughput and per-document latency percentiles next to the simulator's
+counters (429s, 500s, peak in-flight calls).
+
+The result cache is bypassed so every document reaches the endpoint.
+Identical documents in flight at the same time are still coalesced by the
+client (see SingleFlight), so pass at least --documents distinct files or
+let the driver generate a synthetic corpus (PDF rasterization needs poppler,
+as in production).
+
+Usage:
+    python3 benchmarks/load_test.py --documents 40 --concurrency 8
+    python3 benchmarks/load_test.py /path/to/estimates --concurrency 16 --rate-429 0.05 --capacity 20
+    python3 benchmarks/load_test.py --endpoint http://127.0.0.1:8099 --page-concurrency 2 --max-retries 5
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import generate_corpus
+from vision_sim import add_simulator_arguments, make_server
+
+DOCUMENT_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg')
+
+
+def percentile(samples, p):
+    """
+    Nearest-rank percentile of samples
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def collect_documents(paths):
+    """
+    Document files from the given files and directories, in name order
+    """
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            documents += sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(DOCUMENT_EXTENSIONS))
+        else:
+            documents.append(path)
+    return documents
+
+
+def run_load(client, documents, concurrency):
+    """
+    Extract every document, concurrency at a time
+
+    Returns:
+        Tuple of (wall seconds, per-document records)
+    """
+    records = []
+    lock = threading.Lock()
+
+    def extract(path):
+        start = time.perf_counter()
+        result = client.extract_invoice_items_from_image(path)
+        latency = time.perf_counter() - start
+        metrics = (result or {}).get('_metrics') or {}
+        vision = metrics.get('stages', {}).get('vision_call', {})
+        record = {
+            'path': path,
+            'ok': result is not None,
+            'latency_s': latency,
+            'vision_calls': vision.get('calls', 0),
+            'vision_wall_s': vision.get('wall_s', 0.0),
+            'usage': metrics.get('usage', {}),
+        }
+        with lock:
+            records.append(record)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(extract, documents))
+    return time.perf_counter() - start, records
+
+
+def summarize(wall, records):
+    latencies = [r['latency_s'] for r in records if r['ok']]
+    calls = sum(r['vision_calls'] for r in records)
+    usage = {}
+    for record in records:
+        for key, value in record['usage'].items():
+            usage[key] = usage.get(key, 0) + value
+    return {
+        'documents': len(records),
+        'failed': sum(1 for r in records if not r['ok']),
+        'wall_s': wall,
+        'docs_per_s': len(records) / wall if wall else None,
+        'vision_calls': calls,
+        'vision_call_mean_s': sum(r['vision_wall_s'] for r in records) / calls if calls else None,
+        'latency_s': {f'p{p}': percentile(latencies, p) for p in (50, 95, 99)},
+        'latency_max_s': max(latencies) if latencies else None,
+        'usage': usage,
+    }
+
+
+def _endpoint_stats(endpoint):
+    try:
+        with urllib.request.urlopen(endpoint.rstrip('/') + '/stats', timeout=5) as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the Vision extraction path against the simulator')
+    parser.add_argument('paths', nargs='*', help='Documents or directories (default: synthetic PDF corpus)')
+    parser.add_argument('--documents', type=int, default=20, help='Documents to extract (inputs are cycled)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Documents in flight')
+    parser.add_argument('--pages', type=int, default=2, help='Pages per synthetic estimate')
+    parser.add_argument('--page-concurrency', type=int,
+                        help='Vision calls in flight per document (AZURE_VISION_MAX_CONCURRENCY)')
+    parser.add_argument('--max-retries', type=int, help='Retries per Vision call (AZURE_VISION_MAX_RETRIES)')
+    parser.add_argument('--endpoint', help='Use a running simulator (or any endpoint) instead of starting one')
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    add_simulator_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if args.endpoint:
+        endpoint = args.endpoint
+    else:
+        server = make_server(args)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        endpoint = server.url
+        os.environ['AZURE_OPENAI_API_KEY'] = 'simulator'
+    os.environ['AZURE_OPENAI_ENDPOINT'] = endpoint
+    os.environ['AZURE_VISION_CACHE_BYPASS'] = '1'
+    os.environ['AZURE_VISION_METRICS'] = '1'
+    os.environ.setdefault('OCR_LOG_LEVEL', 'ERROR')
+    if args.page_concurrency is not None:
+        os.environ['AZURE_VISION_MAX_CONCURRENCY'] = str(args.page_concurrency)
+    if args.max_retries is not None:
+        os.environ['AZURE_VISION_MAX_RETRIES'] = str(args.max_retries)
+
+    from django_ocr.utils.azure_openai_client import AzureOpenAIClient
+
+    with tempfile.TemporaryDirectory() as tmp:
+        documents = collect_documents(args.paths)
+        if not documents:
+            documents = generate_corpus(tmp, count=args.documents, pages=args.pages)
+        documents = [documents[i % len(documents)] for i in range(args.documents)]
+
+        client = AzureOpenAIClient()
+        # Build the SDK client up front so its import is not timed
+        if client.client is None:
+            sys.exit('Vision client is not configured (set AZURE_OPENAI_API_KEY for --endpoint)')
+        wall, records = run_load(client, documents, args.concurrency)
+
+    report = summarize(wall, records)
+    report['coalesced'] = client.single_flight.coalesced
+    report['endpoint'] = server.stats() if server else _endpoint_stats(endpoint)
+    if server:
+        server.shutdown()
+        server.server_close()
+
+    latency = report['latency_s']
+    print(f'{report["documents"]} documents ({report["failed"]} failed) in {wall:.2f}s '
+          f'-> {report["docs_per_s"]:.2f} docs/s, concurrency {args.concurrency}')
+    if latency['p50'] is not None:
+        print(f'latency p50 {latency["p50"]:.3f}s  p95 {latency["p95"]:.3f}s  '
+              f'p99 {latency["p99"]:.3f}s  max {report["latency_max_s"]:.3f}s')
+    if report['vision_calls']:
+        print(f'vision calls {report["vision_calls"]} (mean {report["vision_call_mean_s"]:.3f}s incl. retries), '
+              f'coalesced documents {report["coalesced"]}')
+    if report['endpoint'] and 'requests' in report['endpoint']:
+        stats = report['endpoint']
+        print(f'endpoint: {stats["requests"]} requests ({stats["replayed"]} replayed, '
+              f'{stats["synthesized"]} synthesized), {stats["rate_limited"]} rate limited, '
+              f'{stats["over_capacity"]} over capacity, {stats["server_errors"]} server errors, '
+              f'peak in flight {stats["peak_in_flight"]}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(dict(report, records=records), f, indent=2, ensure_ascii=False)
+        print(f'report -> {args.output}')
+    sys.exit(1 if report['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
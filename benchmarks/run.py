@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Stage benchmarks for the python_engine pipeline.
+
+Times each stage separately over synthetic corpora (see synthetic.py):
+
+    ocr        ocr_backends.extract_pages (text layer when pypdf is installed, stub otherwise)
+    parse      parser.parse_invoice_data
+    normalize  normalizer.normalize_item (generated MVP engine)
+    dictionary normalizer.classify_item (python_engine, dictionary rules)
+    serialize  json.dumps of the output document, as main.py prints it
+
+Before timing, every document's parse is checked against the item count and
+totals synthetic.py recorded for it; a scenario that extracts the wrong
+result fails the run instead of being reported as fast. The check needs the
+text_layer backend (pypdf) and is skipped with the stub.
+
+Results are written as JSON; pass --compare to fail on regressions.
+
+Usage:
+    python3 benchmarks/run.py
+    python3 benchmarks/run.py --compare benchmarks/results/baseline.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'generated', 'python_engine_mvp', 'python_engine'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ocr_backends import extract_pages, iter_lines
+from parser import parse_invoice_data
+from normalizer import normalize_item
+from synthetic import generate_corpus
+
+
+def _load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# python_engine's own imports (e.g. fuzzy_index) resolve after the generated
+# engine's modules, which share names like normalizer
+sys.path.append(os.path.join(ROOT, 'python_engine'))
+engine_normalizer = _load_module('engine_normalizer', os.path.join(ROOT, 'python_engine', 'normalizer.py'))
+
+# name -> synthetic.generate_corpus keyword arguments
+SCENARIOS = {
+    'small': {'lines': 10, 'pages': 1},
+    'large': {'lines': 200, 'pages': 5},
+    'fullwidth': {'lines': 30, 'pages': 1, 'fullwidth': True},
+    'fee_box': {'lines': 30, 'pages': 2, 'fee_box': True},
+    'summary_row': {'lines': 20, 'pages': 1, 'summary_row': True},
+}
+
+
+def _time(fn, repeat):
+    """
+    Run fn repeat times; return (min, median) wall seconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return min(samples), statistics.median(samples)
+
+
+def check_scenario(pdf_paths):
+    """
+    Compare each document's parse with the expected parse written next to it.
+
+    Returns:
+        List of mismatch descriptions, or None when the OCR backend does not
+        read the synthetic text (stub)
+    """
+    mismatches = []
+    for path in pdf_paths:
+        backend, pages = extract_pages(path)
+        if backend != 'text_layer':
+            return None
+        with open(os.path.splitext(path)[0] + '.json', encoding='utf-8') as f:
+            expected = json.load(f)
+        doc = parse_invoice_data(iter_lines(pages))
+        got = dict(doc, items=len(doc['items']))
+        diffs = [f'{key} {got.get(key)} != {value}' for key, value in expected.items() if got.get(key) != value]
+        if diffs:
+            mismatches.append(f'{os.path.basename(path)}: ' + ', '.join(diffs))
+    return mismatches
+
+
+def bench_scenario(pdf_paths, repeat):
+    """
+    Time every stage over one corpus, feeding each stage the previous stage's output.
+    """
+    pages = [extract_pages(path)[1] for path in pdf_paths]
+    parsed = [parse_invoice_data(iter_lines(p)) for p in pages]
+    names = [item['item_name_raw'] for doc in parsed for item in doc['items']]
+    outputs = []
+    for doc in parsed:
+        items = []
+        for item in doc['items']:
+            item_name_norm, cost_type = normalize_item(item['item_name_raw'])
+            items.append({'item_name_raw': item['item_name_raw'], 'item_name_norm': item_name_norm,
+                          'cost_type': cost_type, 'amount_excl_tax': item['amount_excl_tax']})
+        outputs.append(dict(doc, items=items))
+
+    def normalize():
+        normalize_item.cache_clear()
+        for name in names:
+            normalize_item(name)
+
+    def dictionary():
+        engine_normalizer.classify_item.cache_clear()
+        for name in names:
+            engine_normalizer.classify_item(name)
+
+    stages = {
+        'ocr': lambda: [extract_pages(path) for path in pdf_paths],
+        'parse': lambda: [parse_invoice_data(iter_lines(p)) for p in pages],
+        'normalize': normalize,
+        'dictionary': dictionary,
+        'serialize': lambda: [json.dumps(o, ensure_ascii=False, indent=2) for o in outputs],
+    }
+
+    results = {}
+    for stage, fn in stages.items():
+        best, median = _time(fn, repeat)
+        results[stage] = {
+            'min_s': best,
+            'median_s': median,
+            'per_doc_us': best / len(pdf_paths) * 1e6,
+            'docs_per_s': len(pdf_paths) / best if best else None,
+        }
+    results['ocr']['backend'] = extract_pages(pdf_paths[0])[0]
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """
+    Return a list of "scenario/stage" regressions slower than baseline by more than tolerance.
+    """
+    regressions = []
+    for scenario, stages in current['results'].items():
+        for stage, result in stages.items():
+            base = baseline.get('results', {}).get(scenario, {}).get(stage)
+            if not base or not base.get('min_s'):
+                continue
+            ratio = result['min_s'] / base['min_s']
+            if ratio > 1 + tolerance:
+                regressions.append(f'{scenario}/{stage}: {ratio:.2f}x slower '
+                                   f'({base["per_doc_us"]:.1f} -> {result["per_doc_us"]:.1f} us/doc)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark python_engine pipeline stages')
+    parser.add_argument('--count', type=int, default=50, help='Documents per scenario')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Run only these scenarios (repeatable)')
+    parser.add_argument('--output', help='Results JSON path (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Baseline results JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown ratio (default 0.2)')
+    args = parser.parse_args()
+
+    current = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'count': args.count,
+            'repeat': args.repeat,
+        },
+        'results': {},
+        'checks': {},
+    }
+    failed = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.scenario or SCENARIOS:
+            paths = generate_corpus(os.path.join(tmp, name), count=args.count, **SCENARIOS[name])
+            mismatches = check_scenario(paths)
+            current['checks'][name] = mismatches
+            if mismatches is None:
+                print(f'{name:10s} parse check skipped (stub OCR backend)')
+            elif mismatches:
+                failed.append(name)
+                print(f'MISMATCH {name}: {len(mismatches)}/{len(paths)} documents, e.g. {mismatches[0]}')
+            current['results'][name] = bench_scenario(paths, args.repeat)
+            for stage, result in current['results'][name].items():
+                print(f'{name:10s} {stage:10s} {result["per_doc_us"]:10.1f} us/doc')
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f'results -> {output}')
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(current, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == '__main__':
+    main()
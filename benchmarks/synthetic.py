@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Synthetic Japanese repair-estimate corpus for benchmarks.
+
+Generates estimate text in the layout ocr_stub.py returns, with knobs for
+line count, page count, full-width digits and 諸費用 (statutory fee) boxes,
+and renders it to PDFs that carry a real text layer (standard library only).
+
+Usage:
+    python3 benchmarks/synthetic.py --out /tmp/corpus --count 20 --lines 40 --pages 3
+"""
+import os
+import json
+import random
+import argparse
+from datetime import date, timedelta
+
+VENDORS = ['株式会社サンプル自動車', '有限会社ミナト整備', 'オートサービス青葉', '東和モータース株式会社']
+
+PARTS = [
+    ('ワイパーブレード', 1800, 4800), ('エンジンオイル 4L', 4000, 9000), ('オイルフィルター', 900, 2200),
+    ('ブレーキパッド', 8000, 18000), ('エアフィルター', 1800, 4200), ('バッテリー', 9000, 28000),
+    ('タイヤ 195/65R15', 7000, 16000), ('ワイパーラバー', 600, 1500), ('スパークプラグ', 800, 2400),
+    ('クーラント', 1500, 3500),
+]
+
+LABOR = ['交換工賃', '点検工賃', '取付工賃', '調整工賃']
+
+FEES = [('自賠責保険', 17650, 20010), ('重量税', 8200, 32800), ('印紙代', 1800, 2300), ('検査代行料', 8000, 15000)]
+
+FULLWIDTH = str.maketrans('0123456789,', '０１２３４５６７８９，')
+
+
+def _yen(amount, fullwidth=False):
+    text = f'{amount:,}円'
+    return text.translate(FULLWIDTH) if fullwidth else text
+
+
+def generate_estimate(rng, lines=20, pages=1, fullwidth=False, fee_box=False, summary_row=False):
+    """
+    Return a list of page texts for one synthetic estimate.
+    """
+    return build_estimate(rng, lines, pages, fullwidth, fee_box, summary_row)[0]
+
+
+def build_estimate(rng, lines=20, pages=1, fullwidth=False, fee_box=False, summary_row=False):
+    """
+    Return (page texts, expected parse) for one synthetic estimate.
+
+    The expected parse holds what parser.parse_invoice_data should find:
+    item count (line items plus 諸費用 lines) and both totals. With
+    summary_row, 小計/消費税/合計 share one line, as on many printed forms.
+    """
+    vendor = rng.choice(VENDORS)
+    estimate_date = date(2024, 1, 1) + timedelta(days=rng.randrange(700))
+    body = []
+    subtotal = 0
+    for n in range(1, lines + 1):
+        if rng.random() < 0.3:
+            name = rng.choice(PARTS)[0].split()[0] + rng.choice(LABOR)
+            amount = rng.randrange(1000, 8000, 100)
+        else:
+            name, low, high = rng.choice(PARTS)
+            amount = rng.randrange(low, high, 100)
+        subtotal += amount
+        body.append(f'{n}. {name} {_yen(amount, fullwidth)}')
+
+    fees = []
+    fee_total = 0
+    if fee_box:
+        fees.append('【諸費用】')
+        for name, low, high in rng.sample(FEES, k=rng.randint(2, len(FEES))):
+            amount = rng.randrange(low, high, 10)
+            fee_total += amount
+            fees.append(f'{name} {_yen(amount, fullwidth)}')
+
+    tax = subtotal // 10
+    footer = [
+        f'小計（税抜）: {_yen(subtotal, fullwidth)}',
+        f'消費税（10%）: {_yen(tax, fullwidth)}',
+        f'合計（税込）: {_yen(subtotal + tax + fee_total, fullwidth)}',
+    ]
+    if summary_row:
+        footer = ['\u3000'.join(footer)]
+
+    per_page = max(1, -(-len(body) // pages))
+    page_texts = []
+    for p in range(pages):
+        page = []
+        if p == 0:
+            page += [vendor, f'見積日: {estimate_date.isoformat()}', '', '品目:']
+            page += fees
+        page += body[p * per_page:(p + 1) * per_page]
+        if p == pages - 1:
+            page += [''] + footer
+        page_texts.append('\n'.join(page) + '\n')
+    expected = {
+        'items': lines + len(fees) - (1 if fees else 0),
+        'total_excl_tax': subtotal,
+        'total_incl_tax': subtotal + tax + fee_total,
+    }
+    return page_texts, expected
+
+
+def render_pdf(page_texts, path, font_size=10):
+    """
+    Write a minimal PDF whose text layer contains page_texts.
+
+    Text uses the predefined HeiseiKakuGo-W5 / UniJIS-UCS2-H CJK font with a
+    ToUnicode map, so viewers render it and extractors (pypdf, pdfminer)
+    recover the original Unicode text.
+    """
+    objects = {}
+
+    def add(num, body):
+        objects[num] = body if isinstance(body, bytes) else body.encode('latin-1')
+
+    page_count = len(page_texts)
+    font_num, tounicode_num = 3, 4
+    first_page = 5
+    kids = ' '.join(f'{first_page + 2 * i} 0 R' for i in range(page_count))
+
+    add(1, '<< /Type /Catalog /Pages 2 0 R >>')
+    add(2, f'<< /Type /Pages /Kids [{kids}] /Count {page_count} >>')
+    add(font_num,
+        '<< /Type /Font /Subtype /Type0 /BaseFont /HeiseiKakuGo-W5 /Encoding /UniJIS-UCS2-H'
+        f' /ToUnicode {tounicode_num} 0 R'
+        ' /DescendantFonts [<< /Type /Font /Subtype /CIDFontType0 /BaseFont /HeiseiKakuGo-W5'
+        ' /CIDSystemInfo << /Registry (Adobe) /Ordering (Japan1) /Supplement 2 >>'
+        ' /FontDescriptor << /Type /FontDescriptor /FontName /HeiseiKakuGo-W5 /Flags 4'
+        ' /FontBBox [-92 -250 1010 922] /ItalicAngle 0 /Ascent 880 /Descent -120'
+        ' /CapHeight 737 /StemV 69 >> /DW 1000 >>] >>')
+
+    # Codes are UCS-2, so ToUnicode is the identity for every character used
+    chars = sorted({ord(c) for text in page_texts for c in text if c != '\n'})
+    mappings = [f'<{c:04X}> <{c:04X}>' for c in chars]
+    cmap = ['/CIDInit /ProcSet findresource begin 12 dict begin begincmap',
+            '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def',
+            '/CMapName /Adobe-Identity-UCS def /CMapType 2 def',
+            '1 begincodespacerange <0000> <FFFF> endcodespacerange']
+    for i in range(0, len(mappings), 100):
+        chunk = mappings[i:i + 100]
+        cmap += [f'{len(chunk)} beginbfchar'] + chunk + ['endbfchar']
+    cmap += ['endcmap CMapName currentdict /CMap defineresource pop end end']
+    cmap_stream = '\n'.join(cmap).encode('latin-1')
+    add(tounicode_num, b'<< /Length %d >>\nstream\n' % len(cmap_stream) + cmap_stream + b'\nendstream')
+
+    for i, text in enumerate(page_texts):
+        ops = [f'BT /F1 {font_size} Tf {font_size * 1.4:.1f} TL 40 800 Td']
+        for line in text.splitlines():
+            ops.append(f'<{line.encode("utf-16-be").hex().upper()}> Tj T*')
+        ops.append('ET')
+        content = '\n'.join(ops).encode('latin-1')
+        page_num = first_page + 2 * i
+        add(page_num, f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]'
+                      f' /Resources << /Font << /F1 {font_num} 0 R >> >> /Contents {page_num + 1} 0 R >>')
+        add(page_num + 1, b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += b'%d 0 obj\n' % num + objects[num] + b'\nendobj\n'
+    xref = len(out)
+    size = max(objects) + 1
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for num in range(1, size):
+        out += b'%010d 00000 n \n' % offsets[num]
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref)
+
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def generate_corpus(out_dir, count=10, lines=20, pages=1, fullwidth=False, fee_box=False,
+                    summary_row=False, seed=0):
+    """
+    Write count estimates as .txt / .pdf pairs plus a .json expected parse
+    (see build_estimate); returns the PDF paths.
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        page_texts, expected = build_estimate(rng, lines, pages, fullwidth, fee_box, summary_row)
+        base = os.path.join(out_dir, f'estimate_{i:05d}')
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(''.join(page_texts))
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(expected, f)
+        render_pdf(page_texts, base + '.pdf')
+        paths.append(base + '.pdf')
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic repair estimates')
+    parser.add_argument('--out', required=True, help='Output directory')
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--lines', type=int, default=20, help='Line items per estimate')
+    parser.add_argument('--pages', type=int, default=1)
+    parser.add_argument('--fullwidth', action='store_true', help='Use full-width digits')
+    parser.add_argument('--fee-box', action='store_true', help='Add a 諸費用 box')
+    parser.add_argument('--summary-row', action='store_true', help='Put 小計/消費税/合計 on one line')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.out, args.count, args.lines, args.pages,
+                            args.fullwidth, args.fee_box, args.summary_row, args.seed)
+    print(f'wrote {len(paths)} estimates -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Offline Azure OpenAI Vision simulator for load tests.
+
+Serves the chat-completions route the openai SDK's AzureOpenAI client calls
+(POST /openai/deployments/<deployment>/chat/completions?api-version=...), so
+AzureOpenAIClient runs unmodified with AZURE_OPENAI_ENDPOINT pointed here:
+
+    replay     responses recorded in a JSONL file, keyed by the SHA-256 of the
+               request's image URLs (pages encode deterministically, so the
+               same document and settings hit the same recording)
+    misses     a synthetic estimate page seeded by the same hash, or a 400
+               with --on-miss error
+    record     --record-upstream forwards misses to a real endpoint and
+               appends its 200 responses to the recordings file
+    faults     latency drawn from --latency, 429 / 500 at --rate-429 /
+               --rate-500 (429s carry Retry-After), and 429 whenever more
+               than --capacity requests are in flight
+
+GET /stats returns request counters as JSON.
+
+Usage:
+    python3 benchmarks/vision_sim.py --port 8099 --latency lognormal:1.5,0.4 --rate-429 0.05
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8099 AZURE_OPENAI_API_KEY=sim python3 ...
+"""
+import os
+import sys
+import json
+import math
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import PARTS, VENDORS
+
+ROUTE_PREFIX = '/openai/deployments/'
+ROUTE_SUFFIX = '/chat/completions'
+
+
+def parse_latency(spec):
+    """
+    Latency sampler (seconds) from a spec:
+
+        0.8                  fixed
+        fixed:0.8            fixed
+        uniform:0.5,2        uniform between the bounds
+        normal:1.2,0.3       normal (mean, stddev), clamped at 0
+        lognormal:1.2,0.4    log-normal (median, sigma); long right tail like real calls
+    """
+    kind, _, params = spec.partition(':')
+    if not params:
+        kind, params = 'fixed', kind
+    try:
+        values = [float(v) for v in params.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'bad latency spec: {spec}')
+    shapes = {
+        'fixed': (1, lambda rng, v: v[0]),
+        'uniform': (2, lambda rng, v: rng.uniform(v[0], v[1])),
+        'normal': (2, lambda rng, v: max(0.0, rng.gauss(v[0], v[1]))),
+        'lognormal': (2, lambda rng, v: rng.lognormvariate(math.log(v[0]), v[1]) if v[0] > 0 else 0.0),
+    }
+    if kind not in shapes or len(values) != shapes[kind][0]:
+        raise argparse.ArgumentTypeError(f'bad latency spec: {spec}')
+    sample = shapes[kind][1]
+    return lambda rng: sample(rng, values)
+
+
+def image_urls(body):
+    """
+    Image URLs of a chat-completions request body, in message order
+    """
+    urls = []
+    for message in body.get('messages') or []:
+        content = message.get('content')
+        if not isinstance(content, list):
+            continue
+        for part in content:
+            if isinstance(part, dict) and part.get('type') == 'image_url':
+                image = part.get('image_url') or {}
+                urls.append((image.get('url') or '', image.get('detail') or 'auto'))
+    return urls
+
+
+def _text_chars(body):
+    """
+    Characters of prompt text in a chat-completions request body
+    """
+    chars = 0
+    for message in body.get('messages') or []:
+        content = message.get('content')
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(part.get('text') or '') for part in content if isinstance(part, dict))
+    return chars
+
+
+def image_key(urls):
+    """
+    Recording key: SHA-256 over the request's image URLs
+    """
+    digest = hashlib.sha256()
+    for url, _ in urls:
+        digest.update(url.encode('ascii', 'replace'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def _image_tokens(url, detail):
+    """
+    Image tokens the real service would bill, from the encoded image's size
+    """
+    from django_ocr.utils.image_optimizer import VISION_BASE_TOKENS, vision_tokens
+
+    if detail == 'low':
+        return VISION_BASE_TOKENS
+    try:
+        from io import BytesIO
+        from PIL import Image
+
+        with Image.open(BytesIO(base64.b64decode(url.split(',', 1)[1]))) as image:
+            return vision_tokens(*image.size)
+    except Exception:
+        return VISION_BASE_TOKENS
+
+
+def synthetic_page(key):
+    """
+    Plausible page payload for a request with no recording, seeded by its key
+    """
+    rng = random.Random(key)
+    items = []
+    for _ in range(rng.randint(2, 8)):
+        name, low, high = rng.choice(PARTS)
+        amount = rng.randrange(low, high, 100)
+        items.append({'item_name_raw': name, 'quantity': 1, 'amount_excl_tax': amount})
+    subtotal = sum(item['amount_excl_tax'] for item in items)
+    return {
+        'vendor_address': rng.choice(VENDORS),
+        'items': items,
+        'total_amount_excl_tax': subtotal,
+        'total_amount_incl_tax': subtotal + subtotal // 10,
+    }
+
+
+class Recordings:
+    """JSONL store of recorded responses: {"key": ..., "response": {...}} per line"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._responses = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._responses[record['key']] = record['response']
+
+    def __len__(self):
+        return len(self._responses)
+
+    def get(self, key):
+        return self._responses.get(key)
+
+    def add(self, key, response):
+        with self._lock:
+            self._responses[key] = response
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'key': key, 'response': response}, ensure_ascii=False) + '\n')
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency='0', rate_429=0.0, rate_500=0.0, retry_after=1.0, capacity=0,
+                 recordings=None, on_miss='synthetic', record_upstream=None, seed=None):
+        super().__init__(address, SimulatorHandler)
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.retry_after = retry_after
+        self.capacity = capacity
+        self.recordings = recordings if recordings is not None else Recordings()
+        self.on_miss = on_miss
+        self.record_upstream = record_upstream.rstrip('/') if record_upstream else None
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counters = {'requests': 0, 'ok': 0, 'replayed': 0, 'synthesized': 0, 'recorded': 0,
+                         'rate_limited': 0, 'over_capacity': 0, 'server_errors': 0, 'misses': 0,
+                         'peak_in_flight': 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def draw(self):
+        """
+        One request's fate: (latency seconds, injected status or None)
+        """
+        with self._lock:
+            latency = self.latency(self.rng)
+            roll = self.rng.random()
+        if roll < self.rate_429:
+            return latency, 429
+        if roll < self.rate_429 + self.rate_500:
+            return latency, 500
+        return latency, None
+
+    def enter(self):
+        """
+        Admit a request; False when it exceeds capacity
+        """
+        with self._lock:
+            self.counters['requests'] += 1
+            if self.capacity and self.in_flight >= self.capacity:
+                return False
+            self.in_flight += 1
+            self.counters['peak_in_flight'] = max(self.counters['peak_in_flight'], self.in_flight)
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, in_flight=self.in_flight, recordings=len(self.recordings))
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, code, message, headers=None):
+        self._send(status, {'error': {'code': code, 'message': message}}, headers)
+
+    def _rate_limited(self, message):
+        headers = {}
+        if self.server.retry_after:
+            # The SDK reads retry-after-ms first; AzureOpenAIClient reads retry-after
+            headers = {'retry-after': f'{self.server.retry_after:g}',
+                       'retry-after-ms': str(int(self.server.retry_after * 1000))}
+        self._error(429, '429', message, headers)
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/stats':
+            self._send(200, self.server.stats())
+        else:
+            self._error(404, 'NotFound', f'No route for GET {self.path}')
+
+    def do_POST(self):
+        route = self.path.split('?')[0]
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if not (route.startswith(ROUTE_PREFIX) and route.endswith(ROUTE_SUFFIX)):
+            self._error(404, 'NotFound', f'No route for POST {route}')
+            return
+        deployment = route[len(ROUTE_PREFIX):-len(ROUTE_SUFFIX)]
+
+        server = self.server
+        if not server.enter():
+            server.count('over_capacity')
+            self._rate_limited('Requests exceed the simulated deployment capacity. Please retry later.')
+            return
+        try:
+            latency, injected = server.draw()
+            if injected == 429:
+                server.count('rate_limited')
+                self._rate_limited('Requests to the ChatCompletions_Create Operation have exceeded '
+                                   'the simulated rate limit. Please retry later.')
+                return
+            time.sleep(latency)
+            if injected == 500:
+                server.count('server_errors')
+                self._error(500, 'InternalServerError', 'Simulated server error.')
+                return
+
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                self._error(400, 'BadRequest', 'Request body is not JSON.')
+                return
+            response = self._complete(deployment, body, raw)
+            if response is not None:
+                server.count('ok')
+                self._send(200, response)
+        finally:
+            server.leave()
+
+    def _complete(self, deployment, body, raw):
+        """
+        Recorded, upstream or synthetic completion for a request; None once an
+        error response has been sent
+        """
+        server = self.server
+        urls = image_urls(body)
+        key = image_key(urls)
+        response = server.recordings.get(key)
+        if response is not None:
+            server.count('replayed')
+            return response
+
+        server.count('misses')
+        if server.record_upstream:
+            request = urllib.request.Request(
+                server.record_upstream + self.path, data=raw, method='POST',
+                headers={'Content-Type': 'application/json', 'api-key': self.headers.get('api-key', '')})
+            try:
+                with urllib.request.urlopen(request, timeout=120) as upstream:
+                    response = json.loads(upstream.read())
+            except urllib.error.HTTPError as e:
+                self._error(e.code, str(e.code), f'Upstream error: {e.reason}')
+                return None
+            except (OSError, ValueError) as e:
+                # URLError, timeouts, resets and unparseable bodies: report
+                # the upstream as unusable instead of dropping the connection
+                self._error(502, 'BadGateway', f'Upstream unreachable: {e}')
+                return None
+            server.recordings.add(key, response)
+            server.count('recorded')
+            return response
+
+        if server.on_miss == 'error':
+            self._error(400, 'NoRecording', f'No recorded response for image key {key}')
+            return None
+
+        server.count('synthesized')
+        content = json.dumps(synthetic_page(key), ensure_ascii=False)
+        # Japanese text runs at roughly two characters per token
+        prompt_tokens = _text_chars(body) // 2 + sum(_image_tokens(url, detail) for url, detail in urls)
+        completion_tokens = len(content) // 2
+        return {
+            'id': 'chatcmpl-sim-' + key[:24],
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': deployment,
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content},
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'prompt_tokens_details': {'cached_tokens': 0},
+            },
+        }
+
+
+def _latency_spec(spec):
+    parse_latency(spec)
+    return spec
+
+
+def add_simulator_arguments(parser):
+    """
+    Fault-injection and replay options, shared with load_test.py
+    """
+    parser.add_argument('--latency', default='lognormal:1.5,0.4', type=_latency_spec,
+                        help='Per-call latency: fixed:S, uniform:A,B, normal:MEAN,SD or lognormal:MEDIAN,SIGMA '
+                             '(default lognormal:1.5,0.4)')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Share of calls answered 429')
+    parser.add_argument('--rate-500', type=float, default=0.0, help='Share of calls answered 500')
+    parser.add_argument('--retry-after', type=float, default=1.0,
+                        help='Retry-After seconds on 429s (0 omits the header)')
+    parser.add_argument('--capacity', type=int, default=0,
+                        help='Answer 429 when more calls than this are in flight (0 = unlimited)')
+    parser.add_argument('--recordings', help='JSONL file of recorded responses to replay')
+    parser.add_argument('--on-miss', choices=('synthetic', 'error'), default='synthetic',
+                        help='Unrecorded images: synthetic page or 400 (default synthetic)')
+    parser.add_argument('--record-upstream', help='Forward unrecorded calls to this endpoint and record them')
+    parser.add_argument('--seed', type=int, help='Seed for latency and fault draws')
+
+
+def make_server(args, host='127.0.0.1', port=0):
+    """
+    SimulatorServer configured from add_simulator_arguments options
+    """
+    return SimulatorServer(
+        (host, port), latency=args.latency, rate_429=args.rate_429, rate_500=args.rate_500,
+        retry_after=args.retry_after, capacity=args.capacity, recordings=Recordings(args.recordings),
+        on_miss=args.on_miss, record_upstream=args.record_upstream, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline Azure OpenAI Vision simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    add_simulator_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(args, args.host, args.port)
+    print(f'simulating Azure OpenAI at {server.url} ({len(server.recordings)} recordings)', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats()))
+
+
+if __name__ == '__main__':
+    main()
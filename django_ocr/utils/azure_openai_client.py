@@ -1,14 +1,41 @@
 """
 Azure OpenAI Client for Invoice Data Extraction using Vision API
+
+PIL, pdf2image and the openai SDK are imported on first use, so importing
+this module and constructing the client stay cheap for callers that only
+hit the result cache (or never reach the Vision path at all).
 """
 import os
+import copy
 import json
-import base64
-from typing import Dict, List, Optional
-from io import BytesIO
-from PIL import Image
-from pdf2image import convert_from_path
-from openai import AzureOpenAI
+import logging
+import time
+import random
+import sqlite3
+import tempfile
+import threading
+import contextvars
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from .extraction_cache import ExtractionCache
+from .metrics import StageMetrics
+from .page_regions import (MAX_AREA_RATIO, REGIONS_VERSION, TOKEN_RATIO, add_text_blocks, area_ratio,
+                           locate_regions)
+from .page_triage import DEFAULT_TRIAGE_THRESHOLD, PageTriage
+from .single_flight import SingleFlight, file_lock
+from .structured_logging import get_logger, request_context
+from .vision_prompts import build_prompt, prompt_mode_for
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = get_logger(__name__)
+
+
+class PageConversionError(RuntimeError):
+    """A document page could not be rasterized or encoded"""
 
 
 class AzureOpenAIClient:
@@ -19,23 +46,108 @@ class AzureOpenAIClient:
         self.endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
         self.deployment = os.getenv('AZURE_DEPLOYMENT_NAME', 'gpt-4o')
         self.api_version = os.getenv('AZURE_API_VERSION', '2024-12-01-preview')
-
-        if not self.api_key or not self.endpoint:
-            print("WARNING: Azure OpenAI credentials not configured. Vision extraction will be skipped.")
-            self.client = None
-        else:
-            # Remove trailing slash from endpoint
-            endpoint_clean = self.endpoint.rstrip('/')
-
-            self.client = AzureOpenAI(
-                api_key=self.api_key,
-                azure_endpoint=endpoint_clean,
-                api_version=self.api_version,
-            )
+        # Per-page Vision calls in flight at once, and retries on 429/5xx
+        self.max_concurrency = max(1, int(os.getenv('AZURE_VISION_MAX_CONCURRENCY', '4')))
+        self.max_retries = max(0, int(os.getenv('AZURE_VISION_MAX_RETRIES', '3')))
+        self.dpi = 200
+        # Built once; AZURE_VISION_PROMPT_MODE selects full/compact per deployment
+        self.prompt = build_prompt(prompt_mode_for(self.deployment))
+        # Upload budget per page image (see image_optimizer)
+        self.image_token_budget = int(os.getenv('AZURE_VISION_IMAGE_TOKEN_BUDGET', '0')) or None
+        self.max_image_bytes = int(os.getenv('AZURE_VISION_MAX_IMAGE_BYTES', str(1024 * 1024))) or None
+        # Local pre-pass that skips pages without a priced table (see page_triage);
+        # AZURE_VISION_TRIAGE=0 sends every page
+        self.triage_enabled = os.getenv('AZURE_VISION_TRIAGE', '1').lower() not in ('0', 'false', 'no')
+        self.triage_threshold = float(os.getenv('AZURE_VISION_TRIAGE_THRESHOLD', str(DEFAULT_TRIAGE_THRESHOLD)))
+        # AZURE_VISION_ROI=1: send PDF pages as a low-detail overview plus crops of
+        # their ruled regions and the text around them, re-rendered at
+        # AZURE_VISION_ROI_DPI (see page_regions)
+        self.roi_enabled = os.getenv('AZURE_VISION_ROI', '').lower() in ('1', 'true', 'yes')
+        self.roi_dpi = int(os.getenv('AZURE_VISION_ROI_DPI', '300'))
+
+        # Per-stage timings are always collected; AZURE_VISION_METRICS=1 adds a
+        # `_metrics` block to results and AZURE_VISION_METRICS_FILE receives
+        # process totals in OpenMetrics format.
+        self.emit_metrics = os.getenv('AZURE_VISION_METRICS', '').lower() in ('1', 'true', 'yes')
+        self.metrics_file = os.getenv('AZURE_VISION_METRICS_FILE')
+        self.metrics_total = StageMetrics()
+
+        # Content-addressed result cache, opened on first use (see cache);
+        # AZURE_VISION_CACHE_BYPASS=1 skips it
+        self.cache_bypass = os.getenv('AZURE_VISION_CACHE_BYPASS', '').lower() in ('1', 'true', 'yes')
+        self.cache_path = os.getenv('AZURE_VISION_CACHE_PATH') or os.path.join(
+            tempfile.gettempdir(), 'azure_vision_cache.sqlite3'
+        )
+        self.cache_limits = {
+            'max_entries': int(os.getenv('AZURE_VISION_CACHE_MAX_ENTRIES', '10000')),
+            'max_bytes': int(os.getenv('AZURE_VISION_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+            'ttl_seconds': int(os.getenv('AZURE_VISION_CACHE_TTL', str(30 * 24 * 3600))),
+        }
+        self._cache = None
+        self._cache_failed = False
+        self._cache_lock = threading.Lock()
+        # Identical documents in flight at once share one extraction; the lock
+        # directory extends that to other worker processes on this host
+        self.single_flight = SingleFlight()
+        self.lock_dir = os.getenv('AZURE_VISION_LOCK_DIR') or os.path.join(
+            tempfile.gettempdir(), 'azure_vision_locks'
+        )
+        # Set when lock_dir is unusable; coalescing is then in-process only
+        self._lock_failed = False
+
+        # The SDK client is built on the first Vision call (see client)
+        self.configured = bool(self.api_key and self.endpoint)
+        self._client = None
+        self._client_lock = threading.Lock()
+        if not self.configured:
+            logger.warning("Azure OpenAI credentials not configured; Vision extraction will be skipped")
+
+    @property
+    def client(self):
+        """
+        AzureOpenAI SDK client, created on first use; None without credentials
+        """
+        if self._client is None and self.configured:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import AzureOpenAI
+
+                    self._client = AzureOpenAI(
+                        api_key=self.api_key,
+                        # Remove trailing slash from endpoint
+                        azure_endpoint=self.endpoint.rstrip('/'),
+                        api_version=self.api_version,
+                        # Retries are handled per page in _call_with_retry
+                        max_retries=0,
+                    )
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        # An injected client (or None) decides availability, as before
+        self._client = client
+        self.configured = client is not None
+
+    @property
+    def cache(self) -> Optional[ExtractionCache]:
+        """
+        Result cache, opened on first use; None when bypassed or when it
+        cannot be opened (extraction then runs uncached)
+        """
+        if self._cache is None and not self.cache_bypass and not self._cache_failed:
+            with self._cache_lock:
+                if self._cache is None and not self._cache_failed:
+                    try:
+                        self._cache = ExtractionCache(self.cache_path, **self.cache_limits)
+                    except (sqlite3.Error, OSError) as e:
+                        logger.warning("Extraction cache unavailable at %s, running without it: %s",
+                                       self.cache_path, e)
+                        self._cache_failed = True
+        return self._cache
 
     def convert_file_to_base64_image(self, file_path: str) -> Optional[str]:
         """
-        Convert PDF or image file to Base64-encoded JPEG image
+        Convert PDF or image file to Base64-encoded image (first page only)
 
         Args:
             file_path: Path to PDF or image file
@@ -43,66 +155,274 @@ class AzureOpenAIClient:
         Returns:
             Base64-encoded image string, or None if conversion fails
         """
+        pages = self.iter_page_images(file_path)
+        try:
+            image_url = next(pages, None)
+        finally:
+            pages.close()
+        return image_url.split(',', 1)[1] if image_url else None
+
+    def iter_page_images(self, file_path: str, dpi: int = 200,
+                         metrics: Optional[StageMetrics] = None) -> Iterator[str]:
+        """
+        Rasterize a PDF or image file one page at a time
+
+        Each PDF page is rendered by its own convert_from_path call and released
+        after encoding, so peak memory is bounded by a single page regardless
+        of document length.
+
+        Args:
+            file_path: Path to PDF or image file
+            dpi: Rendering resolution for PDF pages
+            metrics: Collector for the rasterize/encode stage timings
+
+        Yields:
+            Optimized image data URL (data:<mime>;base64,...) for each page, in
+            page order; stops at the first page that cannot be converted
+        """
+        try:
+            for _, image_url, _ in self._iter_pages(file_path, dpi, metrics):
+                yield image_url
+        except PageConversionError:
+            return
+
+    def _iter_pages(self, file_path: str, dpi: int = 200, metrics: Optional[StageMetrics] = None,
+                    triage: Optional[PageTriage] = None,
+                    roi: bool = False) -> Iterator[Tuple[int, str, List[str]]]:
+        """
+        iter_page_images with page numbers, optionally dropping PDF pages that
+        triage scores below its threshold and splitting PDF pages into regions
+
+        At least one page is always yielded: if triage rejects every page, the
+        best-scoring one is sent anyway.
+
+        Raises:
+            PageConversionError: a page failed to rasterize or encode, so the
+                pages yielded so far are not the whole document
+
+        Yields:
+            Tuple of (page number, image data URL, region crop data URLs); with
+            region crops, the image is a low-detail overview of the page
+        """
+        metrics = metrics or StageMetrics()
         try:
             # Check file extension
             file_ext = file_path.lower().split('.')[-1]
 
             if file_ext == 'pdf':
-                # Convert PDF first page to image
-                print(f"DEBUG: Converting PDF to image: {file_path}")
-                images = convert_from_path(file_path, first_page=1, last_page=1, dpi=200)
-
-                if not images:
-                    print("ERROR: PDF conversion returned no images")
-                    return None
-
-                image = images[0]
-                print(f"DEBUG: PDF converted to image: {image.size}")
+                from pdf2image import convert_from_path, pdfinfo_from_path
+
+                page_count = pdfinfo_from_path(file_path).get('Pages', 0)
+                logger.debug("Converting PDF to images: %s (%d pages)", file_path, page_count)
+                if page_count < 2:
+                    triage = None
+                # Best rejected page as (score, page number, image), kept as the fallback
+                fallback = None
+                forwarded = 0
+
+                try:
+                    for page_number in range(1, page_count + 1):
+                        with metrics.stage('rasterize'):
+                            images = convert_from_path(
+                                file_path, first_page=page_number, last_page=page_number, dpi=dpi
+                            )
+                        if not images:
+                            raise PageConversionError(f"PDF conversion returned no image for page {page_number}")
+
+                        image = images[0]
+                        logger.debug("PDF page %d converted to image: %s", page_number, image.size)
+                        if triage is not None:
+                            with metrics.stage('triage'):
+                                decision = triage.score(page_number, image)
+                            if decision.forward:
+                                logger.info("Page %d triage: score=%.2f %s (%s) -> send",
+                                            page_number, decision.score, decision.source, decision.detail)
+                            else:
+                                logger.warning("Page %d of %s skipped by triage: score=%.2f %s (%s) "
+                                               "below %.2f", page_number, file_path, decision.score,
+                                               decision.source, decision.detail, triage.threshold)
+                                if fallback is None or decision.score > fallback[0]:
+                                    if fallback is not None:
+                                        fallback[2].close()
+                                    fallback = (decision.score, page_number, image)
+                                else:
+                                    image.close()
+                                continue
+
+                        forwarded += 1
+                        try:
+                            encoded = self._encode_pdf_page(file_path, page_number, image, dpi, metrics, roi)
+                        finally:
+                            image.close()
+                        yield (page_number,) + encoded
+
+                    if triage is not None:
+                        if not forwarded and fallback is not None:
+                            logger.info("Triage rejected every page; sending best-scoring page %d", fallback[1])
+                        logger.info("Triage sent %d of %d pages of %s", forwarded or 1, page_count, file_path)
+                    if not forwarded and fallback is not None:
+                        _, page_number, image = fallback
+                        fallback = None
+                        try:
+                            encoded = self._encode_pdf_page(file_path, page_number, image, dpi, metrics, roi)
+                        finally:
+                            image.close()
+                        yield (page_number,) + encoded
+                finally:
+                    if fallback is not None:
+                        fallback[2].close()
 
             elif file_ext in ['jpg', 'jpeg', 'png', 'gif', 'bmp']:
+                from PIL import Image
+
                 # Load image directly
-                print(f"DEBUG: Loading image file: {file_path}")
-                image = Image.open(file_path)
-                print(f"DEBUG: Image loaded: {image.size}")
+                with Image.open(file_path) as image, metrics.stage('encode'):
+                    logger.debug("Image loaded: %s %s", file_path, image.size)
+                    encoded = self._encode_image(image)
+                yield 1, encoded, []
 
             else:
-                print(f"ERROR: Unsupported file type: {file_ext}")
-                return None
+                logger.error("Unsupported file type: %s", file_ext)
+
+        except PageConversionError as e:
+            logger.error("Failed to convert file to image: %s: %s", file_path, e)
+            raise
+        except Exception as e:
+            logger.exception("Failed to convert file to image: %s", file_path)
+            raise PageConversionError(str(e)) from e
 
-            # Convert to RGB if necessary (for PNG with alpha channel, etc.)
-            if image.mode not in ('RGB', 'L'):
-                print(f"DEBUG: Converting image mode from {image.mode} to RGB")
-                image = image.convert('RGB')
+    def _encode_pdf_page(self, file_path: str, page_number: int, image: 'Image.Image', dpi: int,
+                         metrics: StageMetrics, roi: bool) -> Tuple[str, List[str]]:
+        """
+        Encode a rasterized PDF page, as region crops when roi is set and the
+        page has ruled regions worth cropping
 
-            # Resize if too large (max 2048px on longest side for better performance)
-            max_size = 2048
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                print(f"DEBUG: Resizing image from {image.size} to {new_size}")
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
+        Returns:
+            Tuple of (image data URL, region crop data URLs)
+        """
+        if roi:
+            regions = self._encode_regions(file_path, page_number, image, dpi, metrics)
+            if regions is not None:
+                return regions
+        with metrics.stage('encode'):
+            return self._encode_image(image), []
+
+    def _encode_regions(self, file_path: str, page_number: int, image: 'Image.Image', dpi: int,
+                        metrics: StageMetrics) -> Optional[Tuple[str, List[str]]]:
+        """
+        Two-resolution encoding: locate ruled regions and the text blocks
+        outside them on the page already rendered at dpi, re-render the page
+        at roi_dpi and crop both, so every printed line reaches the model at
+        high resolution
 
-            # Convert to Base64
-            buffered = BytesIO()
-            image.save(buffered, format="JPEG", quality=95)
-            img_bytes = buffered.getvalue()
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+        The crops share TOKEN_RATIO of the whole page's image tokens in
+        proportion to their area, so the call costs fewer tokens while the
+        numbers are sent at a higher effective resolution.
 
-            print(f"DEBUG: Image converted to Base64: {len(img_base64)} chars")
-            return img_base64
+        Returns:
+            Tuple of (low-detail overview data URL, region crop data URLs), or
+            None when the page is better sent whole
+        """
+        from pdf2image import convert_from_path
+        from .image_optimizer import (OVERVIEW_SIDE, VISION_BASE_TOKENS, optimize_image, target_size,
+                                      vision_tokens)
+
+        with metrics.stage('locate'):
+            regions = locate_regions(image)
+            if regions:
+                regions = add_text_blocks(image, regions)
+        coverage = area_ratio(regions, image.size)
+        if not regions or coverage > MAX_AREA_RATIO:
+            logger.info("Page %d ROI: %d regions covering %.0f%% of the page -> whole page",
+                        page_number, len(regions), coverage * 100)
+            return None
 
-        except Exception as e:
-            print(f"ERROR: Failed to convert file to Base64 image: {e}")
-            import traceback
-            traceback.print_exc()
+        scale = self.roi_dpi / dpi
+        with metrics.stage('rasterize'):
+            pages = convert_from_path(file_path, first_page=page_number, last_page=page_number, dpi=self.roi_dpi)
+        if not pages:
             return None
+        high = pages[0]
+        try:
+            crops = [high.crop(tuple(round(v * scale) for v in box)) for box in regions]
+        finally:
+            high.close()
 
-    def extract_invoice_items_from_image(self, file_path: str) -> Optional[Dict]:
+        try:
+            page_tokens = vision_tokens(*image.size)
+            # Scale from the roi_dpi render to what the model sees of the whole page
+            page_scale = target_size(*image.size)[0] / image.width / scale
+            # Overview is billed at the flat low-detail rate
+            crop_tokens = page_tokens * TOKEN_RATIO - VISION_BASE_TOKENS
+            total_area = sum(crop.width * crop.height for crop in crops)
+            budgets = []
+            for crop in crops:
+                # Never below what the crop costs at the whole page's resolution
+                floor = vision_tokens(max(1, round(crop.width * page_scale)), max(1, round(crop.height * page_scale)))
+                budget = max(floor, int(crop_tokens * crop.width * crop.height / total_area))
+                budgets.append(min(budget, self.image_token_budget) if self.image_token_budget else budget)
+            sizes = [target_size(crop.width, crop.height, budget) for crop, budget in zip(crops, budgets)]
+            region_tokens = VISION_BASE_TOKENS + sum(vision_tokens(*size) for size in sizes)
+            if region_tokens > page_tokens:
+                logger.info("Page %d ROI: %d regions need ~%d image tokens vs ~%d whole -> whole page",
+                            page_number, len(crops), region_tokens, page_tokens)
+                return None
+
+            with metrics.stage('encode'):
+                overview = image.copy()
+                overview.thumbnail((OVERVIEW_SIDE, OVERVIEW_SIDE))
+                overview_url, _ = optimize_image(overview, max_bytes=self.max_image_bytes)
+                region_urls = [
+                    optimize_image(crop, token_budget=budget, max_bytes=self.max_image_bytes)[0]
+                    for crop, budget in zip(crops, budgets)
+                ]
+            if logger.isEnabledFor(logging.INFO):
+                # Resolution the model sees: whole page vs the sharpest-downscaled crop
+                page_dpi = self.roi_dpi * page_scale
+                crop_dpi = min(self.roi_dpi * size[0] / crop.width for crop, size in zip(crops, sizes))
+                logger.info("Page %d ROI: %d regions covering %.0f%%, ~%d image tokens vs ~%d whole, "
+                            "~%d DPI vs ~%d whole", page_number, len(crops), coverage * 100,
+                            region_tokens, page_tokens, crop_dpi, page_dpi)
+            return overview_url, region_urls
+        finally:
+            for crop in crops:
+                crop.close()
+
+    def _encode_image(self, image: 'Image.Image') -> str:
+        """
+        Optimize and encode a single page image as a data URL
+        """
+        from .image_optimizer import optimize_image
+
+        original_size = image.size
+        image_url, encoded_size = optimize_image(
+            image, token_budget=self.image_token_budget, max_bytes=self.max_image_bytes
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Image %s optimized to %d bytes (%s)",
+                         original_size, encoded_size, image_url[5:image_url.index(';')])
+        return image_url
+
+    def extract_invoice_items_from_image(self, file_path: str, use_cache: bool = True,
+                                         request_id: Optional[str] = None) -> Optional[Dict]:
         """
         Extract invoice line items and totals from PDF/image using GPT-4o Vision
 
+        Each page is sent as its own Vision call; up to max_concurrency calls run
+        concurrently and the per-page results are merged in page order.
+
+        PDF pages that page triage scores as having no priced table are skipped
+        (AZURE_VISION_TRIAGE=0 disables this); at least one page is always sent.
+
+        Results are cached by file content hash, deployment, prompt version,
+        DPI and triage threshold, so re-uploads of the same file skip
+        rasterization and the API call.
+
         Args:
             file_path: Path to PDF or image file
+            use_cache: Set False to bypass the result cache for this call
+            request_id: Correlation ID attached to every log record of this call
+                (generated when omitted)
 
         Returns:
             Dict with structure:
@@ -120,197 +440,285 @@ class AzureOpenAIClient:
             }
             Returns None if extraction fails
         """
-        if not self.client:
-            print("Azure OpenAI client not available")
+        if not self.configured:
+            logger.warning("Azure OpenAI client not available")
             return None
 
+        with request_context(request_id):
+            return self._extract_with_cache(file_path, use_cache)
+
+    def _extract_with_cache(self, file_path: str, use_cache: bool) -> Optional[Dict]:
+        """
+        Serve the extraction from the result cache, or run it and store the result
+
+        Concurrent calls for the same document (same cache key) are coalesced
+        into one extraction, within this process and across processes sharing
+        the lock directory.
+        """
+        metrics = StageMetrics()
+        use_cache = use_cache and self.cache is not None
+        cache_key = None
+        cached = None
+        try:
+            with metrics.stage('cache_lookup'):
+                cache_key = ExtractionCache.make_key(
+                    ExtractionCache.file_digest(file_path), self.deployment, self.prompt.version, self.dpi,
+                    self._pipeline_key()
+                )
+                if use_cache:
+                    cached = self.cache.get(cache_key)
+        except OSError as e:
+            logger.warning("Cannot hash %s: %s", file_path, e)
+        except sqlite3.Error as e:
+            logger.warning("Extraction cache unavailable: %s", e)
+            use_cache = False
+
+        if cached is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Extraction cache hit for %s (%s)", file_path, self.cache.stats())
+            return self._attach_metrics(cached, metrics)
+
+        if cache_key is None:
+            return self._attach_metrics(self._extract_uncached(file_path, metrics), metrics)
+
+        result, shared = self.single_flight.do(
+            cache_key, lambda: self._extract_exclusive(file_path, cache_key, use_cache, metrics)
+        )
+        if shared:
+            logger.info("Coalesced with an in-flight extraction of %s", file_path)
+            # Every caller gets its own copy of the shared result
+            result = copy.deepcopy(result)
+        return self._attach_metrics(result, metrics)
+
+    def _pipeline_key(self) -> str:
+        """
+        Page selection, region and image encoding settings that change what
+        reaches the Vision call
+        """
+        from .image_optimizer import ENCODING_VERSION
+
+        stages = [f'img={ENCODING_VERSION}:{self.image_token_budget or 0}:{self.max_image_bytes or 0}']
+        if self.triage_enabled:
+            stages.append(f'triage={self.triage_threshold:g}')
+        if self.roi_enabled:
+            stages.append(f'roi={REGIONS_VERSION}:{self.roi_dpi}')
+        return '+'.join(stages)
+
+    def _extract_exclusive(self, file_path: str, cache_key: str, use_cache: bool,
+                           metrics: StageMetrics) -> Optional[Dict]:
+        """
+        Extract under the cross-process lock for cache_key, re-checking the
+        cache first in case another process just finished the same document
+        """
+        if not use_cache:
+            return self._extract_uncached(file_path, metrics)
+
+        with ExitStack() as stack:
+            if not self._lock_failed:
+                try:
+                    with metrics.stage('lock_wait'):
+                        stack.enter_context(file_lock(self.lock_dir, cache_key))
+                except OSError as e:
+                    logger.warning("Lock directory %s unusable, coalescing within this process only: %s",
+                                   self.lock_dir, e)
+                    self._lock_failed = True
+            try:
+                cached = self.cache.get(cache_key)
+            except sqlite3.Error as e:
+                logger.warning("Extraction cache unavailable: %s", e)
+                cached = None
+            if cached is not None:
+                logger.info("Extraction of %s completed by another worker", file_path)
+                return cached
+
+            result = self._extract_uncached(file_path, metrics)
+            if result is not None:
+                try:
+                    self.cache.put(cache_key, result)
+                except sqlite3.Error as e:
+                    logger.warning("Failed to store extraction result in cache: %s", e)
+            return result
+
+    def _attach_metrics(self, result: Optional[Dict], metrics: StageMetrics) -> Optional[Dict]:
+        """
+        Fold per-call metrics into the process totals and optionally into the result
+        """
+        self.metrics_total.merge(metrics)
+        if self.metrics_file:
+            try:
+                self.metrics_total.write_openmetrics(
+                    self.metrics_file, labels={'deployment': self.deployment, 'prompt': self.prompt.version}
+                )
+            except OSError as e:
+                logger.warning("Failed to write metrics file: %s", e)
+        if self.emit_metrics and result is not None:
+            result = dict(result, _metrics=metrics.to_dict())
+        return result
+
+    def _extract_uncached(self, file_path: str, metrics: StageMetrics) -> Optional[Dict]:
+        """
+        Rasterize every page and run the Vision extraction, without the cache
+        """
         try:
-            # Convert file to Base64 image
-            image_base64 = self.convert_file_to_base64_image(file_path)
-            if not image_base64:
-                print("ERROR: Failed to convert file to Base64 image")
+            page_results = {}
+            in_flight = {}
+
+            def collect(return_when):
+                done, _ = wait(in_flight, return_when=return_when)
+                for future in done:
+                    page_results[in_flight.pop(future)] = future.result()
+
+            # Pages are rasterized lazily; at most max_concurrency encoded pages
+            # are held in memory while their Vision calls run.
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                triage = None
+                if self.triage_enabled:
+                    triage = PageTriage.for_file(file_path, self.triage_threshold)
+                pages = self._iter_pages(file_path, self.dpi, metrics, triage, self.roi_enabled)
+                for page_number, image_url, region_urls in pages:
+                    # Run in a copy of the context so page logs keep the request ID
+                    future = executor.submit(
+                        contextvars.copy_context().run,
+                        self._extract_page, image_url, page_number, metrics, region_urls
+                    )
+                    in_flight[future] = page_number
+                    if len(in_flight) >= self.max_concurrency:
+                        collect(FIRST_COMPLETED)
+                if in_flight:
+                    collect(ALL_COMPLETED)
+
+            if not page_results:
+                logger.error("No page images produced for %s", file_path)
                 return None
 
-            # Construct the system prompt - simple and focused on visual analysis
-            system_prompt = """
-あなたは、自動車整備の見積書を視覚的に解析するプロフェッショナルAIです。
-画像を見て、表形式の明細行と合計金額を読み取り、構造化データに変換してください。
-
-# 抽出ルール
-1. **視覚的な表構造の認識**:
-   - 画像内の表（テーブル）を視覚的に認識してください
-   - 各行は1つの明細アイテムを表します
-   - 列: 品名、数量、単価、金額などを識別
-
-2. **【重要】枠外の諸費用ボックスを必ず探す**:
-   - **メインの明細表とは別に**、紙面の右上、右下、または欄外にある「諸費用」「法定費用」「代行料」と書かれた小さな表や枠を必ずスキャンしてください
-   - これらの枠内にある項目（例：検査代行料、引取納車費用、自賠責保険、重量税、印紙代など）も、必ず `items` 配列に追加してください
-   - **これらの項目を見落とすと、合計金額が合わなくなります**
-   - 諸費用欄の特徴:
-     - 通常、メインの明細表より小さい独立した表や枠線で囲まれている
-     - 「諸費用」「法定費用」「その他費用」などの見出しがある
-     - 金額が数千円～数万円の項目が複数並んでいる
-
-3. **品名の抽出**:
-   - 純粋な日本語の品名を抽出（記号、部品番号は除外）
-   - 例: 「#バッテリー」→「バッテリー」
-   - 例: 「76470-72M01 ワイパーラバー」→「ワイパーラバー」
-
-4. **金額の抽出**:
-   - 「金額」または「単価」列の数値を抽出
-   - カンマ区切り（1,000）を数値化（1000）
-
-5. **法定費用の分類**:
-   - 「自賠責」「重量税」「印紙」「法定費用」「検査登録」という単語が含まれる項目は、非課税として分類してください
-   - これらの項目は `cost_type` を `"statutory_fees"` としてください
-   - 例: 「自賠責保険」→ `cost_type: "statutory_fees"`
-   - 例: 「重量税」→ `cost_type: "statutory_fees"`
-   - 例: 「印紙代」→ `cost_type: "statutory_fees"`
-
-6. **集計行の除外**:
-   - 明細表内の「小計」行は items に含めない
-
-7. **業者住所の抽出**:
-   - 見積書の発行元（工場・業者）の住所を `vendor_address` として抽出してください
-   - **除外ルール**: 以下は請求先（自社）の住所なので抽出しないこと
-     - 「東京都渋谷区神南1-19-4」
-     - 「株式会社IDOM」の住所
-   - 通常、見積書の上部または左上に記載されている発行元の住所を抽出
-   - 住所が見つからない場合は null を返す
-
-8. **【最重要】合計金額の厳格な分類**:
-   見積書の最下部にある金額を正確に分類してください。以下の優先順位で判断すること。
-
-   **A. `total_amount_incl_tax`（税込合計 = 最終支払金額）**:
-   - これは **Grand Total（お客様が実際に支払う最終金額）** です
-   - ラベル例: 「総合計」「合計（税込）」「お支払額」「Grand Total」
-   - **見積書の一番下に大きく強調されている金額**
-   - 消費税が既に含まれている最終的な数字
-   - **もし金額が1つしか強調表示されていない場合、それは税込合計として扱う**
-
-   **B. `total_amount_excl_tax`（税抜合計 = 小計）**:
-   - これは **Subtotal（消費税や諸費用が加算される前の中間金額）** です
-   - ラベル例: 「小計」「合計（税抜）」「対象額」「Subtotal」
-   - **部品代 + 技術料の合計（消費税は含まない）**
-   - Grand Totalより小さい金額
-   - この金額に消費税を足すとGrand Totalになる
-
-   **判断ルール**:
-   1. 見積書に2つの合計金額がある場合:
-      - 小さい方 → `total_amount_excl_tax`（税抜）
-      - 大きい方 → `total_amount_incl_tax`（税込）
-   2. 見積書に1つしか合計金額がない場合:
-      - その金額 → `total_amount_incl_tax`（税込）
-      - `total_amount_excl_tax` → null
-   3. 「消費税」という行がある場合:
-      - その直前の金額 → `total_amount_excl_tax`（税抜）
-      - その直後の金額 → `total_amount_incl_tax`（税込）
-
-9. **【厳守】合計金額の再計算禁止**:
-   - 画像から読み取った総合計金額（`total_amount_incl_tax`）が、明細の合計と合わない場合でも、**画像に印字されている「総合計金額（Grand Total）」を最優先**して出力してください
-   - **絶対に勝手に計算して数値を捏造しないこと**
-   - 見積書に印刷されている金額こそが正しい公式金額です
-   - 明細の合計と総合計が一致しない場合は、以下のいずれかの理由があります:
-     - 枠外の諸費用項目を見落としている（必ず再スキャン）
-     - 値引きや調整が加えられている
-     - 端数処理による誤差
-   - いずれの場合も、**画像に印刷されている総合計金額をそのまま出力**してください
-
-10. **出力フォーマット**:
-   {
-     "vendor_address": "業者の住所" or null,
-     "items": [
-       {"item_name_raw": "品名", "amount_excl_tax": 数値, "quantity": 数値, "cost_type": "parts/labor/statutory_fees/other"}
-     ],
-     "total_amount_excl_tax": 数値 or null（税抜小計）,
-     "total_amount_incl_tax": 数値（税込合計 = 最終支払金額）
-   }
-
-JSONのみを返してください。
-"""
+            failed_pages = sorted(n for n, result in page_results.items() if result is None)
+            if failed_pages:
+                logger.error("Vision extraction failed for pages %s", failed_pages)
+                return None
 
-            user_prompt = """この見積書の画像を視覚的に解析してください。
-以下の項目を読み取り、JSON形式で出力してください：
-1. 業者の住所
-2. **メインの明細表（品名、数量、金額）**
-3. **【重要】右上や欄外にある「諸費用」「法定費用」の枠内の項目も必ず抽出してください**
-4. フッターにある合計金額（税抜・税込）
+            result = self._merge_page_results(page_results)
+            logger.info("Vision API extracted %d items from %d pages", len(result['items']), len(page_results))
+            logger.debug("Extracted vendor_address=%s total_excl_tax=%s total_incl_tax=%s",
+                         result['vendor_address'], result['total_amount_excl_tax'], result['total_amount_incl_tax'])
+            return result
 
-※枠外の諸費用項目を見落とさないよう注意してください。これらの項目が漏れると合計金額が合わなくなります。"""
+        except PageConversionError:
+            # The pages extracted so far are not the whole document: never
+            # merge them into a result, which would then be cached
+            logger.error("Not extracting %s: a page could not be converted", file_path)
+            return None
+        except Exception:
+            logger.exception("Azure OpenAI Vision API call failed")
+            return None
 
-            print("=" * 80)
-            print("DEBUG: Calling Azure OpenAI Vision API for invoice extraction...")
-            print(f"DEBUG: Image Base64 length: {len(image_base64)} chars")
-            print("=" * 80)
+    def _extract_page(self, image_url: str, page_number: int, metrics: StageMetrics,
+                      region_urls: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Run one Vision call for a single page and parse its JSON payload
 
+        With region_urls, image_url is the page overview and the crops are
+        sent alongside it in the same call.
+
+        Returns:
+            Parsed page result, or None if the call or JSON parsing fails
+        """
+        logger.debug("Calling Vision API for page %d (image payload %d chars)", page_number, len(image_url))
+
+        try:
             # Call GPT-4o Vision API
-            response = self.client.chat.completions.create(
-                model=self.deployment,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": user_prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=2000,
-                response_format={"type": "json_object"}
-            )
+            with metrics.stage('vision_call'):
+                response = self._call_with_retry(
+                    model=self.deployment,
+                    messages=self.prompt.messages(image_url, region_urls),
+                    temperature=0.3,
+                    max_tokens=2000,
+                    response_format={"type": "json_object"}
+                )
+        except Exception as e:
+            logger.error("Vision API call failed for page %d: %s", page_number, e)
+            return None
 
-            # Extract response
-            content = response.choices[0].message.content
-            print(f"DEBUG: Vision API response: {content[:500]}...")
+        usage = getattr(response, 'usage', None)
+        metrics.add_usage(usage)
+        if usage is not None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            logger.info("Vision API usage (page %d, %s prompt): prompt=%s cached=%s completion=%s",
+                        page_number, self.prompt.mode, usage.prompt_tokens,
+                        getattr(details, 'cached_tokens', None), usage.completion_tokens)
 
-            # Parse JSON
-            try:
-                result = json.loads(content)
-                vendor_address = result.get('vendor_address')
-                items = result.get('items', [])
-                total_excl_tax = result.get('total_amount_excl_tax')
-                total_incl_tax = result.get('total_amount_incl_tax')
-
-                print(f"DEBUG: Vision API extracted vendor_address: {vendor_address}")
-                print(f"DEBUG: Vision API extracted {len(items)} items")
-                print(f"DEBUG: AI-extracted total (excl tax): {total_excl_tax}")
-                print(f"DEBUG: AI-extracted total (incl tax): {total_incl_tax}")
-
-                return {
-                    'vendor_address': vendor_address,
-                    'items': items,
-                    'total_amount_excl_tax': total_excl_tax,
-                    'total_amount_incl_tax': total_incl_tax
-                }
-            except json.JSONDecodeError as e:
-                print(f"ERROR: Failed to parse Vision API JSON response: {e}")
-                print(f"Response was: {content}")
-                return None
+        # Extract response
+        content = response.choices[0].message.content
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Vision API response (page %d): %s", page_number, content[:500])
 
-        except Exception as e:
-            print(f"ERROR: Azure OpenAI Vision API call failed: {e}")
-            import traceback
-            traceback.print_exc()
+        # Parse JSON
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError as e:
+            logger.error("Failed to parse Vision API JSON response for page %d: %s", page_number, e)
+            logger.debug("Response was: %s", content)
             return None
 
+    def _call_with_retry(self, **kwargs):
+        """
+        Call chat.completions.create, retrying 429s and transient server errors
+        with jittered exponential backoff (honouring Retry-After when present,
+        up to the maximum backoff)
+        """
+        from openai import APIConnectionError, InternalServerError, RateLimitError
+
+        max_backoff = 30
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.client.chat.completions.create(**kwargs)
+            except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, max_backoff) * (0.5 + random.random())
+                response = getattr(e, 'response', None)
+                retry_after = response.headers.get('retry-after') if response is not None else None
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                # Neither jitter nor a misbehaving endpoint's Retry-After may
+                # park a worker beyond the maximum backoff
+                delay = min(delay, max_backoff)
+                logger.warning("Vision API call failed (%s), retrying in %.1fs", e.__class__.__name__, delay)
+                time.sleep(delay)
+
+    @staticmethod
+    def _merge_page_results(page_results: Dict[int, Dict]) -> Dict:
+        """
+        Merge per-page results in page order
+
+        Items are concatenated. Totals come from the last page that reports a
+        grand total (total_amount_incl_tax), since that is the page carrying it.
+        """
+        merged = {
+            'vendor_address': None,
+            'items': [],
+            'total_amount_excl_tax': None,
+            'total_amount_incl_tax': None
+        }
+        for page_number in sorted(page_results):
+            result = page_results[page_number]
+            if merged['vendor_address'] is None:
+                merged['vendor_address'] = result.get('vendor_address')
+            merged['items'].extend(result.get('items') or [])
+            if result.get('total_amount_incl_tax') is not None:
+                merged['total_amount_incl_tax'] = result['total_amount_incl_tax']
+                merged['total_amount_excl_tax'] = result.get('total_amount_excl_tax')
+            elif merged['total_amount_incl_tax'] is None and result.get('total_amount_excl_tax') is not None:
+                merged['total_amount_excl_tax'] = result['total_amount_excl_tax']
+        return merged
+
     # Legacy method for backward compatibility
     def extract_invoice_items(self, ocr_text: str) -> Optional[List[Dict]]:
         """
         Legacy method for text-based extraction (deprecated)
         Kept for backward compatibility
         """
-        print("WARNING: extract_invoice_items (text-based) is deprecated. Use extract_invoice_items_from_image instead.")
+        logger.warning("extract_invoice_items (text-based) is deprecated. Use extract_invoice_items_from_image instead.")
         return None
@@ -0,0 +1,122 @@
+"""
+Content-addressed on-disk cache for Vision extraction results
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+
+class ExtractionCache:
+    """SQLite-backed result cache with LRU/size-bound eviction and TTL"""
+
+    def __init__(self, path: str, max_entries: int = 10000, max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: int = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # One connection shared across threads; sqlite's file locking covers
+        # other worker processes using the same cache file.
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+
+    @staticmethod
+    def file_digest(file_path: str) -> str:
+        """
+        SHA-256 of the file bytes, read in chunks
+        """
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(file_digest: str, deployment: str, prompt_version: str, dpi: int,
+                 pipeline: str = '') -> str:
+        """
+        Cache key: content hash plus everything that changes the extraction output
+        (pipeline names optional page selection stages such as triage)
+        """
+        key = f"{file_digest}:{deployment}:{prompt_version}:{dpi}"
+        return f"{key}:{pipeline}" if pipeline else key
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Return the cached result for key, or None on miss/expiry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict) -> None:
+        """
+        Store a result and evict least-recently-used entries beyond the bounds
+        """
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data.encode('utf-8')), now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+        count, total_size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        if count <= self.max_entries and total_size <= self.max_bytes:
+            return
+
+        # Walk from the least recently used end until both bounds hold
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY accessed_at"):
+            if count <= self.max_entries and total_size <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total_size -= size
+        self._conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters for this process
+        """
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
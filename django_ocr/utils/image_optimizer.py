@@ -0,0 +1,159 @@
+"""
+Image payload optimizer for Vision API uploads
+
+Crops to the content area, picks the cheapest encoding that preserves the
+page (colour JPEG, grayscale JPEG or a few-level gray PNG for black-and-white
+pages) and sizes the image to the resolution the Vision model actually consumes.
+"""
+import math
+import base64
+from io import BytesIO
+from typing import Optional, Tuple
+from PIL import Image, ImageChops
+
+# GPT-4o "high" detail: image is fit into 2048x2048, then the short side is
+# scaled to 768px and billed per 512px tile.
+VISION_MAX_SIDE = 2048
+VISION_SHORT_SIDE = 768
+VISION_TILE = 512
+VISION_BASE_TOKENS = 85
+VISION_TILE_TOKENS = 170
+# "low" detail: the whole image is fit into 512x512 and billed VISION_BASE_TOKENS
+OVERVIEW_SIDE = 512
+# Gray levels kept for black-and-white pages (a 2-bit PNG); bump ENCODING_VERSION
+# whenever the encoded pixels change, since it is part of the result cache key
+BILEVEL_LEVELS = 4
+ENCODING_VERSION = 2
+
+
+def vision_input_size(width: int, height: int) -> Tuple[int, int]:
+    """
+    Size the Vision model downsamples an image to before tiling
+    """
+    scale = min(1.0, VISION_MAX_SIDE / max(width, height))
+    short_side = min(width, height) * scale
+    if short_side > VISION_SHORT_SIDE:
+        scale *= VISION_SHORT_SIDE / short_side
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def vision_tokens(width: int, height: int) -> int:
+    """
+    Image tokens billed for an image of this size
+    """
+    w, h = vision_input_size(width, height)
+    tiles = math.ceil(w / VISION_TILE) * math.ceil(h / VISION_TILE)
+    return VISION_BASE_TOKENS + VISION_TILE_TOKENS * tiles
+
+
+def target_size(width: int, height: int, token_budget: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Largest size worth uploading: the model's own input size, shrunk further
+    until it fits token_budget
+    """
+    w, h = vision_input_size(width, height)
+    if token_budget:
+        while vision_tokens(w, h) > token_budget and min(w, h) > 64:
+            w, h = int(w * 0.9), int(h * 0.9)
+    return w, h
+
+
+def crop_to_content(image: Image.Image, threshold: int = 245, margin: int = 16) -> Image.Image:
+    """
+    Crop away the blank page margins around the printed content
+    """
+    gray = image.convert('L')
+    bbox = gray.point(lambda p: 255 if p < threshold else 0).getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    bbox = (max(0, left - margin), max(0, top - margin),
+            min(image.width, right + margin), min(image.height, bottom + margin))
+    return image.crop(bbox)
+
+
+def classify_color(image: Image.Image, tolerance: int = 24, color_ratio: float = 0.01,
+                   midtone_ratio: float = 0.05) -> str:
+    """
+    Classify a page as 'color', 'gray' or 'bilevel'
+
+    Chroma is sampled on a thumbnail; midtones are counted at full resolution,
+    since downsampling itself would blur black text into gray.
+    """
+    if image.mode not in ('L', '1'):
+        thumb = image.convert('RGB')
+        thumb.thumbnail((256, 256))
+        r, g, b = thumb.split()
+        chroma = ImageChops.lighter(ImageChops.difference(r, g), ImageChops.difference(g, b))
+        colored = sum(chroma.histogram()[tolerance:])
+        if colored > color_ratio * thumb.width * thumb.height:
+            return 'color'
+
+    histogram = image.convert('L').histogram()
+    midtones = sum(histogram[64:192])
+    # Anti-aliased text edges alone stay well under midtone_ratio
+    if midtones <= midtone_ratio * image.width * image.height:
+        return 'bilevel'
+    return 'gray'
+
+
+def _gray_levels(image: Image.Image, levels: int) -> Image.Image:
+    """
+    Quantize a grayscale image to levels evenly spaced grays (palette image)
+    """
+    step = 255 / (levels - 1)
+    indexed = Image.frombytes('P', image.size, image.point(lambda p: round(p / step)).tobytes())
+    indexed.putpalette([round(i * step) for i in range(levels) for _ in range(3)])
+    return indexed
+
+
+def optimize_image(image: Image.Image, token_budget: Optional[int] = None,
+                   max_bytes: Optional[int] = None, crop: bool = True) -> Tuple[str, int]:
+    """
+    Produce the smallest reasonable Vision payload for a page image
+
+    Args:
+        image: Page image
+        token_budget: Maximum image tokens to spend on this page
+        max_bytes: Maximum encoded image size in bytes
+        crop: Crop blank margins before sizing
+
+    Returns:
+        Tuple of (data URL, encoded image size in bytes)
+    """
+    if crop:
+        image = crop_to_content(image)
+
+    color = classify_color(image)
+    if color == 'color':
+        image = image.convert('RGB')
+        mime, fmt, options = 'image/jpeg', 'JPEG', {'quality': 85, 'optimize': True}
+    elif color == 'gray':
+        image = image.convert('L')
+        mime, fmt, options = 'image/jpeg', 'JPEG', {'quality': 85, 'optimize': True}
+    else:
+        # Threshold at full resolution, where strokes are still solid, to drop
+        # paper tone and scanner noise; the downsampled page keeps a few gray
+        # levels, since 1-bit at the ~90 DPI the model sees breaks kanji apart
+        image = image.convert('L').point(lambda p: 255 if p >= 200 else 0)
+        bits = max(1, (BILEVEL_LEVELS - 1).bit_length())
+        mime, fmt, options = 'image/png', 'PNG', {'optimize': True, 'bits': bits}
+
+    size = target_size(image.width, image.height, token_budget)
+    for _ in range(5):
+        resized = image.resize(size, Image.Resampling.LANCZOS) if size != image.size else image
+        if color == 'bilevel':
+            resized = _gray_levels(resized, BILEVEL_LEVELS)
+        buffered = BytesIO()
+        resized.save(buffered, format=fmt, **options)
+        encoded_size = buffered.tell()
+        if not max_bytes or encoded_size <= max_bytes or min(size) <= 64:
+            break
+        shrink = math.sqrt(max_bytes / encoded_size) * 0.95
+        size = (max(1, int(size[0] * shrink)), max(1, int(size[1] * shrink)))
+
+    # Encode straight from the buffer's memory (no getvalue() copy) and drop
+    # the raw image bytes before building the data URL string.
+    encoded = base64.b64encode(buffered.getbuffer())
+    buffered.close()
+    return f'data:{mime};base64,' + encoded.decode('ascii'), encoded_size
@@ -0,0 +1,119 @@
+"""
+Per-stage instrumentation: wall time, CPU time, peak RSS and API token usage
+
+Each stage costs a perf_counter/thread_time/getrusage call on entry and exit,
+so collection is cheap enough to leave on in production.
+"""
+import os
+import time
+import resource
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class StageMetrics:
+    """Thread-safe accumulator of per-stage timings and token usage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict] = {}
+        self.usage: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a block as one call of stage `name`
+        """
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            # ru_maxrss is the process high-water mark (KiB on Linux)
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            with self._lock:
+                record = self.stages.setdefault(
+                    name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_kb': 0}
+                )
+                record['calls'] += 1
+                record['wall_s'] += wall
+                record['cpu_s'] += cpu
+                record['peak_rss_kb'] = max(record['peak_rss_kb'], peak_rss)
+
+    def add_usage(self, usage) -> None:
+        """
+        Add token counts from a chat completion's `usage` object
+        """
+        if usage is None:
+            return
+        with self._lock:
+            for field in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+                value = getattr(usage, field, None)
+                if value:
+                    self.usage[field] = self.usage.get(field, 0) + value
+            # Prompt tokens served from the provider's prompt cache
+            cached = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+            if cached:
+                self.usage['cached_tokens'] = self.usage.get('cached_tokens', 0) + cached
+
+    def merge(self, other: 'StageMetrics') -> None:
+        """
+        Fold another collector's totals into this one
+        """
+        snapshot = other.to_dict()
+        with self._lock:
+            for name, theirs in snapshot['stages'].items():
+                record = self.stages.setdefault(
+                    name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_kb': 0}
+                )
+                record['calls'] += theirs['calls']
+                record['wall_s'] += theirs['wall_s']
+                record['cpu_s'] += theirs['cpu_s']
+                record['peak_rss_kb'] = max(record['peak_rss_kb'], theirs['peak_rss_kb'])
+            for field, value in snapshot['usage'].items():
+                self.usage[field] = self.usage.get(field, 0) + value
+
+    def to_dict(self) -> Dict:
+        """
+        JSON-serializable snapshot, used as the `_metrics` block
+        """
+        with self._lock:
+            return {
+                'stages': {name: dict(record) for name, record in self.stages.items()},
+                'usage': dict(self.usage),
+            }
+
+    def to_openmetrics(self, prefix: str = 'ocr', labels: Optional[Dict[str, str]] = None) -> str:
+        """
+        Render totals in the OpenMetrics text format
+        """
+        snapshot = self.to_dict()
+        extra = ''.join(f',{key}="{value}"' for key, value in (labels or {}).items())
+        lines = []
+        for metric, field, kind in (('stage_calls', 'calls', 'counter'),
+                                    ('stage_wall_seconds', 'wall_s', 'counter'),
+                                    ('stage_cpu_seconds', 'cpu_s', 'counter'),
+                                    ('stage_peak_rss_kibibytes', 'peak_rss_kb', 'gauge')):
+            lines.append(f'# TYPE {prefix}_{metric} {kind}')
+            suffix = '_total' if kind == 'counter' else ''
+            for name, record in sorted(snapshot['stages'].items()):
+                lines.append(f'{prefix}_{metric}{suffix}{{stage="{name}"{extra}}} {record[field]}')
+        lines.append(f'# TYPE {prefix}_tokens counter')
+        for field, value in sorted(snapshot['usage'].items()):
+            lines.append(f'{prefix}_tokens_total{{kind="{field}"{extra}}} {value}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_openmetrics(self, path: str, **kwargs) -> None:
+        """
+        Atomically replace `path` with the current totals (textfile-collector style)
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.to_openmetrics(**kwargs))
+        os.replace(tmp_path, path)
@@ -0,0 +1,188 @@
+"""
+Region-of-interest location for two-resolution Vision extraction
+
+Finds the ruled areas of a rasterized page (the line-item table, the
+totals block and the small 諸費用/法定費用 boxes) so they can be re-rendered
+at a higher DPI and sent as tight crops next to a low-detail overview of
+the whole page.
+
+Location runs on a coarse grid (GRID pixels per cell): a cell is set when a
+horizontal or vertical stroke at least LINE pixels long crosses it, found
+with the same PIL box-downscaling trick as page_triage (text strokes are
+never that long unbroken). Connected groups of line cells are tables or
+boxes; their bounding boxes, plus a margin, are the regions.
+
+Printed content outside those regions (vendor name and address, the date
+block, unruled 諸費用 lists) is found by add_text_blocks on the same grid and
+cropped too, so nothing on the page is left to the low-detail overview.
+"""
+from typing import TYPE_CHECKING, List, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+Box = Tuple[int, int, int, int]
+
+INK_LEVEL = 128
+SOLID_LEVEL = 230
+# Grid cell size and shortest stroke counted as a line, in pixels
+# (about 2 mm and 6 mm at 200 DPI)
+GRID = 16
+LINE = 48
+# Smallest region, in grid cells, that is a box rather than an underline
+MIN_REGION_CELLS = (4, 2)
+# Margin around each region, in grid cells (keeps labels just outside the rules)
+MARGIN_CELLS = 2
+# Text blocks: ink within this many cells is one block (about 4 mm at 200 DPI,
+# joining the words of a line and the lines of an address); blocks with fewer
+# ink cells than TEXT_MIN_CELLS are specks
+TEXT_JOIN_CELLS = 2
+TEXT_MIN_CELLS = 2
+# Above this share of the page, crops would not beat sending the page whole
+MAX_AREA_RATIO = 0.6
+# Bump when located crops change, since the setting is part of the result cache key
+REGIONS_VERSION = 2
+# Image tokens for overview + crops, relative to sending the page whole; the
+# crops cover less area, so even a smaller budget buys more pixels per mm
+TOKEN_RATIO = 0.75
+
+
+def _line_grid(image: 'Image.Image') -> 'Image.Image':
+    """
+    Coarse mask ('L', one pixel per GRID cell) of cells crossed by a ruling line
+    """
+    from PIL import Image, ImageChops, ImageFilter
+
+    box = Image.Resampling.BOX
+    gray = image.convert('L')
+    width, height = gray.size
+    cols, rows = max(1, width // GRID), max(1, height // GRID)
+    ink = gray.point(lambda p: 255 if p < INK_LEVEL else 0)
+    solid = lambda p: 255 if p >= SOLID_LEVEL else 0
+    touched = lambda p: 255 if p else 0
+    horizontal = (ink.resize((max(1, width // LINE), height), box).point(solid)
+                  .resize((cols, rows), box).point(touched))
+    vertical = (ink.resize((width, max(1, height // LINE)), box).point(solid)
+                .resize((cols, rows), box).point(touched))
+    # Bridge one-cell gaps (broken scan lines, cell padding) before grouping
+    return ImageChops.lighter(horizontal, vertical).filter(ImageFilter.MaxFilter(3))
+
+
+def _components(grid: 'Image.Image') -> List[Box]:
+    """
+    Bounding boxes (in grid cells, right/bottom exclusive) of 4-connected set cells
+    """
+    cols, rows = grid.size
+    cells = grid.tobytes()
+    seen = bytearray(len(cells))
+    boxes = []
+    for start, value in enumerate(cells):
+        if not value or seen[start]:
+            continue
+        seen[start] = 1
+        stack = [start]
+        left, top, right, bottom = cols, rows, 0, 0
+        while stack:
+            index = stack.pop()
+            y, x = divmod(index, cols)
+            left, right = min(left, x), max(right, x + 1)
+            top, bottom = min(top, y), max(bottom, y + 1)
+            for neighbour, inside in ((index - 1, x > 0), (index + 1, x < cols - 1),
+                                      (index - cols, y > 0), (index + cols, y < rows - 1)):
+                if inside and cells[neighbour] and not seen[neighbour]:
+                    seen[neighbour] = 1
+                    stack.append(neighbour)
+        boxes.append((left, top, right, bottom))
+    return boxes
+
+
+def locate_regions(image: 'Image.Image') -> List[Box]:
+    """
+    Ruled regions of a page, in the image's pixel coordinates, top to bottom
+
+    Returns:
+        List of (left, top, right, bottom) boxes; empty when the page has no
+        ruled tables or boxes
+    """
+    grid = _line_grid(image)
+    cols, rows = grid.size
+    min_width, min_height = MIN_REGION_CELLS
+    regions = []
+    for left, top, right, bottom in _components(grid):
+        if right - left < min_width or bottom - top < min_height:
+            continue
+        regions.append((
+            max(0, left - MARGIN_CELLS) * GRID,
+            max(0, top - MARGIN_CELLS) * GRID,
+            min(image.width, min(cols, right + MARGIN_CELLS) * GRID),
+            min(image.height, min(rows, bottom + MARGIN_CELLS) * GRID),
+        ))
+    return sorted(_merge_overlapping(regions), key=lambda box: (box[1], box[0]))
+
+
+def add_text_blocks(image: 'Image.Image', regions: List[Box]) -> List[Box]:
+    """
+    Regions plus blocks of printed content outside them, top to bottom
+
+    Blocks sharing a line band become one box and boxes that overlap are
+    merged: every crop costs at least one tile, so fewer, wider crops are
+    cheaper than many small ones.
+    """
+    from PIL import Image, ImageDraw, ImageFilter
+
+    gray = image.convert('L')
+    cols, rows = max(1, gray.width // GRID), max(1, gray.height // GRID)
+    ink = (gray.point(lambda p: 255 if p < INK_LEVEL else 0)
+           .resize((cols, rows), Image.Resampling.BOX).point(lambda p: 255 if p else 0))
+    draw = ImageDraw.Draw(ink)
+    for left, top, right, bottom in regions:
+        draw.rectangle((left // GRID, top // GRID, -(-right // GRID) - 1, -(-bottom // GRID) - 1), fill=0)
+
+    # Growing every ink cell by TEXT_JOIN_CELLS joins nearby ones and leaves
+    # that much margin around each block
+    joined = ink.filter(ImageFilter.MaxFilter(2 * TEXT_JOIN_CELLS + 1))
+    cells = ink.tobytes()
+    blocks = []
+    for left, top, right, bottom in _components(joined):
+        inked = sum(1 for y in range(top, bottom) for x in range(left, right) if cells[y * cols + x])
+        if inked >= TEXT_MIN_CELLS:
+            blocks.append((left * GRID, top * GRID,
+                           min(image.width, right * GRID), min(image.height, bottom * GRID)))
+
+    bands = []
+    for block in sorted(blocks, key=lambda box: box[1]):
+        if bands and block[1] < bands[-1][3]:
+            band = bands[-1]
+            bands[-1] = (min(band[0], block[0]), band[1], max(band[2], block[2]), max(band[3], block[3]))
+        else:
+            bands.append(block)
+    return sorted(_merge_overlapping(list(regions) + bands), key=lambda box: (box[1], box[0]))
+
+
+def _merge_overlapping(regions: List[Box]) -> List[Box]:
+    """
+    Union boxes that overlap once margins are added, so no content is sent twice
+    """
+    merged = list(regions)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    merged[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def area_ratio(regions: List[Box], size: Tuple[int, int]) -> float:
+    """
+    Share of the page area covered by the (non-overlapping) regions
+    """
+    width, height = size
+    return sum((right - left) * (bottom - top) for left, top, right, bottom in regions) / (width * height)
@@ -0,0 +1,247 @@
+"""
+Page triage: skip pages without a priced table before Vision calls
+
+Multi-page uploads often carry cover letters, maps, photos and terms pages
+next to the estimate itself. Each rasterized page gets a cheap CPU-only
+score in [0, 1] for "contains a priced table / 合計 area":
+
+    text   the PDF text layer (pypdf, when installed and the page has text):
+           amount-like numbers and estimate keywords (合計, 小計, 消費税, ...)
+    image  ruling lines found in row/column ink projections, or unruled
+           line-item rows (a text line with a wide gap before a right-hand
+           column, e.g. name ... amount), with blank pages and photo-like
+           pages (mostly midtones) scored near zero
+
+A page takes the better of the two scores, so a sparse text layer cannot
+hide line items the image shows. Only pages scoring at least the threshold
+are sent. Scans on toned paper are first stretched so the paper is white;
+otherwise a gray background reads as a photo's midtones.
+
+Projections are taken with PIL box downscaling (PIL is imported on first
+use), so no array library is needed: shrinking the ink mask by RULE_CELL
+along a line direction keeps only unbroken strokes at full ink (text breaks
+up into gaps and drops out), pooling RULE_BAND pixels across it tolerates
+scan skew, and a final one-pixel resize gives the share of each band
+covered by strokes. Pixel sizes assume pages rendered at about 200 DPI.
+"""
+import re
+import unicodedata
+import importlib.util
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from .structured_logging import get_logger
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = get_logger(__name__)
+
+DEFAULT_TRIAGE_THRESHOLD = 0.4
+
+ESTIMATE_KEYWORDS = ('合計', '小計', '消費税', '税込', '税抜', '見積', '金額', '単価', '数量',
+                     '工賃', '部品', '諸費用', '法定費用')
+AMOUNT_PATTERN = re.compile(r'[¥￥]\s?\d[\d,]*|\d{1,3}(?:,\d{3})+|\d+\s?円')
+
+# Pixels darker than this count as ink
+INK_LEVEL = 128
+# Cell length (pixels) a stroke must fill, almost entirely, to count as a line
+RULE_CELL = 16
+SOLID_LEVEL = 230
+# Band width (pixels) across the line direction; a skewed rule stays in one or two bands
+RULE_BAND = 24
+# Share of the page width / height a ruling line must span
+RULE_ROW_COVERAGE = 0.35
+RULE_COLUMN_COVERAGE = 0.2
+# Runs over more bands are filled areas (photos, shaded blocks), not rules
+MAX_RULE_BANDS = 2
+# A page frame alone is not a table
+FRAME_RULES = 2
+# Text line height bounds (pixels) and column cell width for line-item rows
+TEXT_LINE_MIN = 8
+TEXT_LINE_MAX = 80
+ROW_CELL = 8
+# Interior gap, as a share of the page width, that separates a name from its amount
+ROW_GAP_RATIO = 0.1
+# Line-item rows that make a page certain; a single row already clears the default threshold
+ITEM_ROWS = 2
+# Scan noise only; sparse pages (a few rows and the 合計) must reach the other signals
+BLANK_INK_RATIO = 0.0003
+PHOTO_MIDTONE_RATIO = 0.25
+# Paper tone: the histogram peak at or above PAPER_LEVEL, when at least
+# PAPER_SHARE of the page lies within PAPER_SPREAD levels of it (photos
+# have no such peak)
+PAPER_LEVEL = 160
+PAPER_SHARE = 0.5
+PAPER_SPREAD = 8
+# Text layers shorter than this are treated as scanned pages
+MIN_TEXT_CHARS = 20
+
+
+@dataclass(frozen=True)
+class TriageDecision:
+    page_number: int
+    score: float
+    forward: bool
+    source: str
+    detail: str
+
+
+def score_text(text: str) -> Tuple[float, str]:
+    """
+    Score a page's text layer: amounts weigh most, keywords add the rest
+    """
+    text = unicodedata.normalize('NFKC', text)
+    keywords = sum(1 for keyword in ESTIMATE_KEYWORDS if keyword in text)
+    amounts = len(AMOUNT_PATTERN.findall(text))
+    score = 0.7 * min(1.0, amounts / 4) + 0.3 * min(1.0, keywords / 3)
+    return score, f'amounts={amounts} keywords={keywords}'
+
+
+def _line_profile(ink: 'Image.Image', horizontal: bool) -> List[int]:
+    """
+    Per band, the share (0-255) of cells along the line direction that hold
+    an unbroken stroke
+    """
+    from PIL import Image
+
+    box = Image.Resampling.BOX
+    width, height = ink.size
+    solid = lambda p: 255 if p >= SOLID_LEVEL else 0
+    touched = lambda p: 255 if p else 0
+    if horizontal:
+        cells, bands = max(1, width // RULE_CELL), max(1, height // RULE_BAND)
+        mask = ink.resize((cells, height), box).point(solid).resize((cells, bands), box).point(touched)
+        return list(mask.resize((1, bands), box).getdata())
+    cells, bands = max(1, height // RULE_CELL), max(1, width // RULE_BAND)
+    mask = ink.resize((width, cells), box).point(solid).resize((bands, cells), box).point(touched)
+    return list(mask.resize((bands, 1), box).getdata())
+
+
+def _runs(profile: List[int], coverage: float, max_thickness: int) -> int:
+    """
+    Count runs of consecutive bands whose coverage is reached, ignoring runs
+    thicker than max_thickness
+    """
+    level = coverage * 255
+    runs = 0
+    length = 0
+    for value in profile + [0]:
+        if value >= level:
+            length += 1
+            continue
+        if 0 < length <= max_thickness:
+            runs += 1
+        length = 0
+    return runs
+
+
+def _item_rows(ink: 'Image.Image') -> int:
+    """
+    Count text lines laid out like unruled line items: ink on both sides of
+    an interior gap of at least ROW_GAP_RATIO of the page width
+    """
+    from PIL import Image
+
+    box = Image.Resampling.BOX
+    width, height = ink.size
+    cells = max(1, width // ROW_CELL)
+    min_gap = ROW_GAP_RATIO * cells
+    profile = list(ink.resize((1, height), box).getdata()) + [0]
+    rows = 0
+    top = None
+    for y, value in enumerate(profile):
+        if value:
+            if top is None:
+                top = y
+            continue
+        if top is not None and TEXT_LINE_MIN <= y - top <= TEXT_LINE_MAX:
+            occupied = [i for i, v in enumerate(ink.crop((0, top, width, y)).resize((cells, 1), box).getdata()) if v]
+            if any(b - a - 1 >= min_gap for a, b in zip(occupied, occupied[1:])):
+                rows += 1
+        top = None
+    return rows
+
+
+def _whiten_paper(gray: 'Image.Image', histogram: List[int]) -> Tuple['Image.Image', List[int]]:
+    """
+    Stretch a page scanned on toned paper so the paper is white
+    """
+    paper = max(range(PAPER_LEVEL, 256), key=histogram.__getitem__)
+    share = sum(histogram[max(0, paper - PAPER_SPREAD):paper + PAPER_SPREAD + 1]) / sum(histogram)
+    if paper >= 255 - PAPER_SPREAD or share < PAPER_SHARE:
+        return gray, histogram
+    gray = gray.point(lambda p: min(255, p * 255 // paper))
+    return gray, gray.histogram()
+
+
+def score_image(image: 'Image.Image') -> Tuple[float, str]:
+    """
+    Score a rasterized page by its ruling lines or line-item rows (tables)
+    and tone (photos)
+    """
+    gray = image.convert('L')
+    gray, histogram = _whiten_paper(gray, gray.histogram())
+    pixels = gray.width * gray.height
+    ink_ratio = sum(histogram[:INK_LEVEL]) / pixels
+    if ink_ratio < BLANK_INK_RATIO:
+        return 0.0, f'blank ink={ink_ratio:.4f}'
+    midtone_ratio = sum(histogram[64:192]) / pixels
+
+    ink = gray.point(lambda p: 255 if p < INK_LEVEL else 0)
+    h_rules = _runs(_line_profile(ink, horizontal=True), RULE_ROW_COVERAGE, MAX_RULE_BANDS)
+    v_rules = _runs(_line_profile(ink, horizontal=False), RULE_COLUMN_COVERAGE, MAX_RULE_BANDS)
+    item_rows = _item_rows(ink)
+    score = max(0.7 * min(1.0, max(0, h_rules - FRAME_RULES) / 4)
+                + 0.3 * min(1.0, max(0, v_rules - FRAME_RULES) / 2),
+                min(1.0, item_rows / ITEM_ROWS))
+    # Mostly midtones is a photo only when no table showed up (dark paper
+    # that _whiten_paper leaves alone is midtones too)
+    if not score and midtone_ratio > PHOTO_MIDTONE_RATIO:
+        return 0.1, f'photo midtones={midtone_ratio:.2f}'
+    return score, f'h_rules={h_rules} v_rules={v_rules} item_rows={item_rows} ink={ink_ratio:.3f}'
+
+
+class PageTriage:
+    """Per-document scorer; reads the PDF text layer once when available"""
+
+    def __init__(self, threshold: Optional[float] = None, reader=None):
+        self.threshold = DEFAULT_TRIAGE_THRESHOLD if threshold is None else threshold
+        self._reader = reader
+
+    @classmethod
+    def for_file(cls, file_path: str, threshold: Optional[float] = None) -> 'PageTriage':
+        """
+        Triage for one document, using its text layer if pypdf can read it
+        """
+        reader = None
+        if file_path.lower().endswith('.pdf') and importlib.util.find_spec('pypdf') is not None:
+            import pypdf
+
+            try:
+                reader = pypdf.PdfReader(file_path)
+            except Exception as e:
+                logger.debug("No text layer for triage of %s: %s", file_path, e)
+        return cls(threshold, reader)
+
+    def _page_text(self, page_number: int) -> str:
+        if self._reader is None:
+            return ''
+        try:
+            return self._reader.pages[page_number - 1].extract_text() or ''
+        except Exception as e:
+            logger.debug("Text layer unreadable on page %d: %s", page_number, e)
+            return ''
+
+    def score(self, page_number: int, image: 'Image.Image') -> TriageDecision:
+        """
+        Decide whether a page is worth a Vision call
+        """
+        score, detail = score_image(image)
+        source = 'image'
+        text = self._page_text(page_number)
+        if len(text.strip()) >= MIN_TEXT_CHARS:
+            text_score, text_detail = score_text(text)
+            if text_score > score:
+                score, detail, source = text_score, text_detail, 'text'
+        return TriageDecision(page_number, round(score, 3), score >= self.threshold, source, detail)
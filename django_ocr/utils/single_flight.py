@@ -0,0 +1,90 @@
+"""
+Single-flight coalescing for duplicate in-flight extractions
+
+Within a process, concurrent callers with the same key share one call's
+result. Across worker processes on the same host, a per-key lock file
+serializes the work so the second process can pick the result up from the
+shared cache instead of repeating it.
+"""
+import os
+import hashlib
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Tuple, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process coalescing
+    fcntl = None
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; later callers wait for its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Call fn, or wait for the call already running for key
+
+        Returns:
+            Tuple of (result, shared); shared is True when the result came from
+            another caller's call. Exceptions raised by fn reach every caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+@contextmanager
+def file_lock(lock_dir: str, key: str) -> Iterator[None]:
+    """
+    Hold an exclusive flock on a per-key lock file in lock_dir
+
+    The kernel drops the lock if the holder dies. Lock files are left in
+    place, since unlinking a file another process may be waiting on races.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(lock_dir, exist_ok=True)
+    name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.lock'
+    fd = os.open(os.path.join(lock_dir, name), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
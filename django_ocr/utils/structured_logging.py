@@ -0,0 +1,121 @@
+"""
+Structured logging for the OCR utilities
+
+Log records go to stderr (or OCR_LOG_FILE), never stdout, which is reserved
+for result documents. Messages use logging's lazy %-style arguments, so a
+record below OCR_LOG_LEVEL costs one level check and is never formatted.
+
+Environment:
+    OCR_LOG_LEVEL   DEBUG / INFO / WARNING (default) / ERROR
+    OCR_LOG_FORMAT  json (default, one object per line) or text
+    OCR_LOG_FILE    Append to this file instead of stderr
+"""
+import os
+import json
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+LOGGER_NAME = 'django_ocr'
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('ocr_request_id', default=None)
+_configure_lock = threading.Lock()
+_configured = False
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the current correlation ID"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Render a record as a single JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', None),
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging() -> logging.Logger:
+    """
+    Attach the OCR_LOG_* handler to the package logger (once per process)
+
+    If the host application has already configured a handler for the
+    package logger (e.g. Django's LOGGING setting), it is left untouched.
+    """
+    global _configured
+    logger = logging.getLogger(LOGGER_NAME)
+    if _configured:
+        return logger
+    with _configure_lock:
+        if _configured or logger.handlers:
+            _configured = True
+            return logger
+
+        log_file = os.getenv('OCR_LOG_FILE')
+        handler = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler()
+        if os.getenv('OCR_LOG_FORMAT', 'json').lower() == 'text':
+            handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+            ))
+        else:
+            handler.setFormatter(JsonLinesFormatter())
+        handler.addFilter(RequestIdFilter())
+
+        logger.addHandler(handler)
+        logger.setLevel(os.getenv('OCR_LOG_LEVEL', 'WARNING').upper())
+        logger.propagate = False
+        _configured = True
+    return logger
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger under the package namespace, configuring output on first use
+    """
+    configure_logging()
+    return logging.getLogger(name if name.startswith(LOGGER_NAME) else f'{LOGGER_NAME}.{name}')
+
+
+def current_request_id() -> Optional[str]:
+    """
+    Correlation ID of the request being processed, if any
+    """
+    return _request_id.get()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Tag all records logged inside the block with a correlation ID
+
+    A new ID is generated unless one is passed in (e.g. from the caller's
+    request header). Worker threads must run inside a copy of the context
+    (contextvars.copy_context().run) to inherit it.
+    """
+    request_id = request_id or uuid.uuid4().hex[:12]
+    token = _request_id.set(request_id)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(token)
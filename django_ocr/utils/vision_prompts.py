@@ -0,0 +1,206 @@
+"""
+Versioned prompt templates for Vision invoice extraction
+
+Each template is built once and reused for every call. Messages are laid
+out static-first (system prompt, then the fixed user instruction, then the
+page image) so the identical prefix qualifies for provider-side prompt
+caching and only the image differs between calls.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Bump whenever a template below changes so cached results are not reused
+VISION_PROMPT_VERSION = 'v1'
+
+PROMPT_MODES = ('full', 'compact')
+
+FULL_SYSTEM_PROMPT = """
+あなたは、自動車整備の見積書を視覚的に解析するプロフェッショナルAIです。
+画像を見て、表形式の明細行と合計金額を読み取り、構造化データに変換してください。
+
+# 抽出ルール
+1. **視覚的な表構造の認識**:
+   - 画像内の表（テーブル）を視覚的に認識してください
+   - 各行は1つの明細アイテムを表します
+   - 列: 品名、数量、単価、金額などを識別
+
+2. **【重要】枠外の諸費用ボックスを必ず探す**:
+   - **メインの明細表とは別に**、紙面の右上、右下、または欄外にある「諸費用」「法定費用」「代行料」と書かれた小さな表や枠を必ずスキャンしてください
+   - これらの枠内にある項目（例：検査代行料、引取納車費用、自賠責保険、重量税、印紙代など）も、必ず `items` 配列に追加してください
+   - **これらの項目を見落とすと、合計金額が合わなくなります**
+   - 諸費用欄の特徴:
+     - 通常、メインの明細表より小さい独立した表や枠線で囲まれている
+     - 「諸費用」「法定費用」「その他費用」などの見出しがある
+     - 金額が数千円～数万円の項目が複数並んでいる
+
+3. **品名の抽出**:
+   - 純粋な日本語の品名を抽出（記号、部品番号は除外）
+   - 例: 「#バッテリー」→「バッテリー」
+   - 例: 「76470-72M01 ワイパーラバー」→「ワイパーラバー」
+
+4. **金額の抽出**:
+   - 「金額」または「単価」列の数値を抽出
+   - カンマ区切り（1,000）を数値化（1000）
+
+5. **法定費用の分類**:
+   - 「自賠責」「重量税」「印紙」「法定費用」「検査登録」という単語が含まれる項目は、非課税として分類してください
+   - これらの項目は `cost_type` を `"statutory_fees"` としてください
+   - 例: 「自賠責保険」→ `cost_type: "statutory_fees"`
+   - 例: 「重量税」→ `cost_type: "statutory_fees"`
+   - 例: 「印紙代」→ `cost_type: "statutory_fees"`
+
+6. **集計行の除外**:
+   - 明細表内の「小計」行は items に含めない
+
+7. **業者住所の抽出**:
+   - 見積書の発行元（工場・業者）の住所を `vendor_address` として抽出してください
+   - **除外ルール**: 以下は請求先（自社）の住所なので抽出しないこと
+     - 「東京都渋谷区神南1-19-4」
+     - 「株式会社IDOM」の住所
+   - 通常、見積書の上部または左上に記載されている発行元の住所を抽出
+   - 住所が見つからない場合は null を返す
+
+8. **【最重要】合計金額の厳格な分類**:
+   見積書の最下部にある金額を正確に分類してください。以下の優先順位で判断すること。
+
+   **A. `total_amount_incl_tax`（税込合計 = 最終支払金額）**:
+   - これは **Grand Total（お客様が実際に支払う最終金額）** です
+   - ラベル例: 「総合計」「合計（税込）」「お支払額」「Grand Total」
+   - **見積書の一番下に大きく強調されている金額**
+   - 消費税が既に含まれている最終的な数字
+   - **もし金額が1つしか強調表示されていない場合、それは税込合計として扱う**
+
+   **B. `total_amount_excl_tax`（税抜合計 = 小計）**:
+   - これは **Subtotal（消費税や諸費用が加算される前の中間金額）** です
+   - ラベル例: 「小計」「合計（税抜）」「対象額」「Subtotal」
+   - **部品代 + 技術料の合計（消費税は含まない）**
+   - Grand Totalより小さい金額
+   - この金額に消費税を足すとGrand Totalになる
+
+   **判断ルール**:
+   1. 見積書に2つの合計金額がある場合:
+      - 小さい方 → `total_amount_excl_tax`（税抜）
+      - 大きい方 → `total_amount_incl_tax`（税込）
+   2. 見積書に1つしか合計金額がない場合:
+      - その金額 → `total_amount_incl_tax`（税込）
+      - `total_amount_excl_tax` → null
+   3. 「消費税」という行がある場合:
+      - その直前の金額 → `total_amount_excl_tax`（税抜）
+      - その直後の金額 → `total_amount_incl_tax`（税込）
+
+9. **【厳守】合計金額の再計算禁止**:
+   - 画像から読み取った総合計金額（`total_amount_incl_tax`）が、明細の合計と合わない場合でも、**画像に印字されている「総合計金額（Grand Total）」を最優先**して出力してください
+   - **絶対に勝手に計算して数値を捏造しないこと**
+   - 見積書に印刷されている金額こそが正しい公式金額です
+   - 明細の合計と総合計が一致しない場合は、以下のいずれかの理由があります:
+     - 枠外の諸費用項目を見落としている（必ず再スキャン）
+     - 値引きや調整が加えられている
+     - 端数処理による誤差
+   - いずれの場合も、**画像に印刷されている総合計金額をそのまま出力**してください
+
+10. **出力フォーマット**:
+   {
+     "vendor_address": "業者の住所" or null,
+     "items": [
+       {"item_name_raw": "品名", "amount_excl_tax": 数値, "quantity": 数値, "cost_type": "parts/labor/statutory_fees/other"}
+     ],
+     "total_amount_excl_tax": 数値 or null（税抜小計）,
+     "total_amount_incl_tax": 数値（税込合計 = 最終支払金額）
+   }
+
+JSONのみを返してください。
+"""
+
+FULL_USER_PROMPT = """この見積書の画像を視覚的に解析してください。
+以下の項目を読み取り、JSON形式で出力してください：
+1. 業者の住所
+2. **メインの明細表（品名、数量、金額）**
+3. **【重要】右上や欄外にある「諸費用」「法定費用」の枠内の項目も必ず抽出してください**
+4. フッターにある合計金額（税抜・税込）
+
+※枠外の諸費用項目を見落とさないよう注意してください。これらの項目が漏れると合計金額が合わなくなります。"""
+
+# Same rules as the full prompt in about a third of the tokens
+COMPACT_SYSTEM_PROMPT = """自動車整備見積書の画像から明細と合計を読み取り、JSONのみを返す。
+- 明細表の各行を1項目とする。「小計」行は除外
+- 明細表とは別の「諸費用」「法定費用」「代行料」枠（右上・右下・欄外）の項目も必ず items に含める
+- 品名は記号・部品番号を除いた日本語名（例:「76470-72M01 ワイパーラバー」→「ワイパーラバー」）
+- 金額はカンマを除いた数値
+- cost_type: 自賠責・重量税・印紙・法定費用・検査登録を含む項目は "statutory_fees"、他は parts/labor/other
+- vendor_address: 発行元の住所。請求先「東京都渋谷区神南1-19-4」「株式会社IDOM」の住所は除外。無ければ null
+- total_amount_incl_tax: 最下部で最も強調された最終支払金額（税込）。合計が1つだけならこちら
+- total_amount_excl_tax: 消費税加算前の小計（税抜）。無ければ null
+- 印字された合計をそのまま出力し、明細から再計算しない
+形式: {"vendor_address": str|null, "items": [{"item_name_raw": str, "amount_excl_tax": int, "quantity": int, "cost_type": str}], "total_amount_excl_tax": int|null, "total_amount_incl_tax": int}"""
+
+COMPACT_USER_PROMPT = "この見積書の明細（欄外の諸費用枠を含む）、業者住所、合計金額（税抜・税込）をJSONで出力してください。"
+
+# Sent after the user prompt when a page arrives as overview + region crops
+REGION_NOTE = """1枚目はページ全体の縮小画像（レイアウトの確認用）、2枚目以降は明細表・合計欄・諸費用枠と、それ以外の記載（業者名・住所・日付・枠のない諸費用など）を高解像度で切り出した画像です。
+住所・品名・金額は切り出し画像から読み取り、切り出しの境界で重なった同じ項目を重複して出力しないでください。"""
+
+
+@dataclass(frozen=True)
+class VisionPrompt:
+    """Prompt texts for one mode, built once per client"""
+    mode: str
+    version: str
+    system: str
+    user: str
+
+    def messages(self, image_url: str, region_urls: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Chat messages for one page: the shared static prefix, then the image
+
+        With region_urls, image_url is a low-detail page overview followed by
+        the high-detail region crops.
+        """
+        content = [{"type": "text", "text": self.user}]
+        if region_urls:
+            content.append({"type": "text", "text": REGION_NOTE})
+            content.append({"type": "image_url", "image_url": {"url": image_url, "detail": "low"}})
+            content.extend({"type": "image_url", "image_url": {"url": url, "detail": "high"}}
+                           for url in region_urls)
+        else:
+            content.append({"type": "image_url", "image_url": {"url": image_url}})
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": content},
+        ]
+
+
+_TEMPLATES = {
+    'full': (FULL_SYSTEM_PROMPT, FULL_USER_PROMPT),
+    'compact': (COMPACT_SYSTEM_PROMPT, COMPACT_USER_PROMPT),
+}
+
+
+def build_prompt(mode: str = 'full') -> VisionPrompt:
+    """
+    Build the prompt for a mode; the version doubles as the cache key component
+    """
+    if mode not in _TEMPLATES:
+        raise ValueError(f"Unknown Vision prompt mode: {mode} (available: {', '.join(PROMPT_MODES)})")
+    system, user = _TEMPLATES[mode]
+    version = VISION_PROMPT_VERSION if mode == 'full' else f'{VISION_PROMPT_VERSION}-{mode}'
+    return VisionPrompt(mode, version, system, user)
+
+
+def prompt_mode_for(deployment: str) -> str:
+    """
+    Prompt mode for a deployment from AZURE_VISION_PROMPT_MODE
+
+    Either a single mode ("compact") or per-deployment entries
+    ("gpt-4o=full,gpt-4o-mini=compact"); unlisted deployments use "full".
+    """
+    setting = os.getenv('AZURE_VISION_PROMPT_MODE', '').strip()
+    if not setting:
+        return 'full'
+    if '=' not in setting:
+        return setting
+    for entry in setting.split(','):
+        name, _, mode = entry.partition('=')
+        if name.strip() == deployment:
+            return mode.strip()
+    return 'full'
@@ -2,7 +2,8 @@
 """Main entry point for PDF parsing engine.
 
 Usage:
-    python python_engine/main.py --pdf <path_to_pdf>
+    python python_engine/main.py --pdf <path_to_pdf> [--ocr-backend text_layer|stub]
+                                 [--metrics] [--metrics-file <path>]
 
 Outputs JSON to stdout with parsed invoice data.
 """
@@ -12,14 +13,34 @@ import json
 import sys
 from pathlib import Path
 
-from ocr_stub import ocr_extract_text
+# Stage metrics are shared with django_ocr (django_ocr/utils/metrics.py)
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from django_ocr.utils.metrics import StageMetrics  # noqa: E402
+from ocr_backends import extract_pages, iter_lines
 from parser import parse_invoice_data
-from normalizer import normalize_item_name, classify_cost_type
+from normalizer import normalize_item
+
+
+def _normalize_items(items):
+    """Attach normalized names and cost types to parsed items."""
+    normalized_items = []
+    for item in items:
+        item_name_norm, cost_type = normalize_item(item['item_name_raw'])
+        normalized_items.append({
+            "item_name_raw": item['item_name_raw'],
+            "item_name_norm": item_name_norm,
+            "cost_type": cost_type,
+            "amount_excl_tax": item['amount_excl_tax']
+        })
+    return normalized_items
 
 
 def main():
     parser = argparse.ArgumentParser(description='Parse PDF invoice and output JSON')
     parser.add_argument('--pdf', required=True, help='Path to PDF file')
+    parser.add_argument('--ocr-backend', help='Force an OCR backend (default: first backend that yields text)')
+    parser.add_argument('--metrics', action='store_true', help='Add per-stage timings as a _metrics block')
+    parser.add_argument('--metrics-file', help='Write per-stage timings in OpenMetrics format to this path')
     args = parser.parse_args()
     
     pdf_path = Path(args.pdf)
@@ -27,22 +48,23 @@ def main():
         print(json.dumps({"error": f"File not found: {pdf_path}"}), file=sys.stderr)
         sys.exit(1)
     
-    # Step 1: Extract text from PDF (OCR stub)
-    raw_text = ocr_extract_text(str(pdf_path))
+    metrics = StageMetrics()
     
-    # Step 2: Parse invoice data from raw text
-    parsed_data = parse_invoice_data(raw_text)
+    # Step 1: Extract text from PDF (text layer when present, OCR otherwise)
+    try:
+        with metrics.stage('ocr'):
+            backend_name, pages = extract_pages(str(pdf_path), args.ocr_backend)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+    
+    # Step 2: Parse invoice data from the streamed page lines
+    with metrics.stage('parse'):
+        parsed_data = parse_invoice_data(iter_lines(pages))
     
     # Step 3: Normalize item names and classify cost types
-    normalized_items = []
-    for item in parsed_data.get('items', []):
-        normalized_item = {
-            "item_name_raw": item['item_name_raw'],
-            "item_name_norm": normalize_item_name(item['item_name_raw']),
-            "cost_type": classify_cost_type(item['item_name_raw']),
-            "amount_excl_tax": item['amount_excl_tax']
-        }
-        normalized_items.append(normalized_item)
+    with metrics.stage('normalize'):
+        normalized_items = _normalize_items(parsed_data.get('items', []))
     
     # Step 4: Build final output JSON
     output = {
@@ -54,7 +76,18 @@ def main():
     }
     
     # Output JSON to stdout
-    print(json.dumps(output, ensure_ascii=False, indent=2))
+    with metrics.stage('serialize'):
+        document = json.dumps(output, ensure_ascii=False, indent=2)
+    if args.metrics:
+        # Attached after the serialize stage so the block includes it; only
+        # this diagnostic path pays for a second dump
+        output['_metrics'] = dict(metrics.to_dict(), ocr_backend=backend_name)
+        document = json.dumps(output, ensure_ascii=False, indent=2)
+    print(document)
+    
+    if args.metrics_file:
+        metrics.write_openmetrics(args.metrics_file, prefix='python_engine',
+                                  labels={'ocr_backend': backend_name})
 
 
 if __name__ == '__main__':
@@ -1,6 +1,45 @@
 """Normalizer module for item names and cost type classification."""
 
-import re
+import os
+import sys
+from functools import lru_cache
+from typing import Tuple
+
+# The keyword matcher is shared with the main engine (python_engine/rule_matcher.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'python_engine'))
+from rule_matcher import KeywordMatcher, compile_keywords, fold  # noqa: E402
+
+# Rule table in the normalization_rules.json schema. Lower priority wins.
+RULES = {
+    'item_name_rules': [
+        {'name': 'wiper_blade', 'priority': 10, 'keywords': ['ワイパー', 'wiper', 'ブレード']},
+    ],
+    'cost_type_rules': [
+        {'name': 'labor', 'priority': 10, 'keywords': ['工賃']},
+    ],
+}
+
+DEFAULT_COST_TYPE = 'parts'
+
+_MATCHER = KeywordMatcher(compile_keywords(RULES))
+
+
+@lru_cache(maxsize=4096)
+def normalize_item(raw_name: str) -> Tuple[str, str]:
+    """Normalize an item name and classify its cost type in one scan.
+
+    Args:
+        raw_name: Raw item name from invoice
+
+    Returns:
+        Tuple of (normalized item name, cost type)
+    """
+    name, cost = _MATCHER.match(fold(raw_name))
+
+    # Return original if no normalization rule matches
+    item_name_norm = name or raw_name
+    cost_type = cost or DEFAULT_COST_TYPE
+    return item_name_norm, cost_type
 
 
 def normalize_item_name(raw_name: str) -> str:
@@ -12,16 +51,7 @@ def normalize_item_name(raw_name: str) -> str:
     Returns:
         Normalized item name
     """
-    raw_name_lower = raw_name.lower()
-    
-    # Wiper blade normalization
-    wiper_keywords = ['ワイパー', 'wiper', 'ブレード']
-    for keyword in wiper_keywords:
-        if keyword in raw_name_lower:
-            return 'wiper_blade'
-    
-    # Return original if no normalization rule matches
-    return raw_name
+    return normalize_item(raw_name)[0]
 
 
 def classify_cost_type(item_name: str) -> str:
@@ -33,9 +63,4 @@ def classify_cost_type(item_name: str) -> str:
     Returns:
         Cost type: 'parts' or 'labor'
     """
-    # Labor classification
-    if '工賃' in item_name:
-        return 'labor'
-    
-    # Default to parts
-    return 'parts'
+    return normalize_item(item_name)[1]
@@ -0,0 +1,122 @@
+"""OCR backend interface and registry.
+
+A backend turns a document into pages of text (optionally with word boxes).
+Backends are tried in registration order and the first one that returns
+text wins, so cheap local backends can short-circuit the OCR path.
+"""
+
+import sys
+import importlib.util
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Protocol, Tuple
+
+from ocr_stub import ocr_extract_text
+
+
+@dataclass
+class OcrPage:
+    """Text of one page; boxes are (x0, y0, x1, y1, text) in PDF points."""
+    number: int
+    text: str
+    boxes: List[Tuple[float, float, float, float, str]] = field(default_factory=list)
+
+
+class OcrBackend(Protocol):
+    """Protocol every OCR backend implements."""
+    name: str
+
+    def available(self) -> bool:
+        """Whether the backend's dependencies are installed."""
+        ...
+
+    def extract(self, path: str) -> List[OcrPage]:
+        """Extract pages of text; an empty list means "no text, fall back"."""
+        ...
+
+
+_REGISTRY: Dict[str, OcrBackend] = {}
+
+
+def register_backend(backend: OcrBackend) -> OcrBackend:
+    """Register a backend; later registrations are tried later."""
+    _REGISTRY[backend.name] = backend
+    return backend
+
+
+def get_backend(name: str) -> OcrBackend:
+    """Look up a registered backend by name."""
+    try:
+        return _REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"Unknown OCR backend: {name} (available: {', '.join(_REGISTRY)})")
+
+
+def extract_pages(path: str, backend_name: Optional[str] = None) -> Tuple[str, List[OcrPage]]:
+    """Extract text pages using the named backend, or the first backend that yields text.
+
+    Args:
+        path: Path to the PDF file
+        backend_name: Force a specific backend instead of the fallback chain
+
+    Returns:
+        Tuple of (name of the backend used, pages)
+    """
+    if backend_name:
+        backend = get_backend(backend_name)
+        if not backend.available():
+            raise ValueError(f"OCR backend not available: {backend_name}")
+        return backend.name, backend.extract(path)
+
+    for backend in _REGISTRY.values():
+        if not backend.available():
+            continue
+        pages = backend.extract(path)
+        if pages:
+            return backend.name, pages
+    return '', []
+
+
+def iter_lines(pages: List[OcrPage]) -> Iterator[str]:
+    """Stream the lines of all pages, in page order."""
+    for page in pages:
+        yield from page.text.splitlines(True)
+
+
+class TextLayerBackend:
+    """Reads the embedded text layer of digitally generated PDFs (no rasterization)."""
+    name = 'text_layer'
+
+    def available(self) -> bool:
+        return importlib.util.find_spec('pypdf') is not None
+
+    def extract(self, path: str) -> List[OcrPage]:
+        import pypdf
+
+        try:
+            reader = pypdf.PdfReader(path)
+            pages = [OcrPage(number, page.extract_text() or '')
+                     for number, page in enumerate(reader.pages, 1)]
+        except Exception as e:
+            # Not a readable PDF (or encrypted); let the next backend handle it
+            print(f"text_layer: {e}", file=sys.stderr)
+            return []
+
+        # Scanned PDFs have no (or only whitespace) text layer
+        if not any(page.text.strip() for page in pages):
+            return []
+        return pages
+
+
+class StubBackend:
+    """Image/OCR path placeholder backed by ocr_stub."""
+    name = 'stub'
+
+    def available(self) -> bool:
+        return True
+
+    def extract(self, path: str) -> List[OcrPage]:
+        return [OcrPage(1, ocr_extract_text(path))]
+
+
+register_backend(TextLayerBackend())
+register_backend(StubBackend())
@@ -1,15 +1,89 @@
 """Parser module for extracting structured data from OCR text."""
 
+import io
 import re
-from typing import Dict, List, Any
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
+# Line classes
+LINE_BLANK = 'blank'
+LINE_HEADER = 'header'
+LINE_ITEM = 'item'
+LINE_SUBTOTAL = 'subtotal'
+LINE_TAX = 'tax'
+LINE_TOTAL = 'total'
+LINE_OTHER = 'other'
 
-def parse_invoice_data(raw_text: str) -> Dict[str, Any]:
+# Full-width digits and separators fold to ASCII one character for one, so
+# match spans on the folded line still index the original text
+_FULLWIDTH = str.maketrans('０１２３４５６７８９，／－', '0123456789,/-')
+
+_AMOUNT = r'(\d{1,3}(?:,\d{3})*)円'
+_DATE_PATTERN = re.compile(r'見積日[:\s：]+(\d{4}[-/]\d{1,2}[-/]\d{1,2})')
+_ITEM_PATTERN = re.compile(r'(?:\d+\.\s+)?(.+?)\s+' + _AMOUNT)
+_SUBTOTAL_PATTERN = re.compile(r'小計[^\d]*' + _AMOUNT)
+_TOTAL_PATTERN = re.compile(r'合計[^\d]*' + _AMOUNT)
+# A line that starts with the value for the label on the line before it
+# (e.g. "小計" then "  10,000円")
+_CONTINUATION_PATTERN = re.compile(r'\s*(?:\d{1,3}(?:,\d{3})*円|\d{4}[-/])')
+
+
+def _to_int(amount_str: str) -> int:
+    return int(amount_str.replace(',', ''))
+
+
+def classify_line(line: str) -> Tuple[str, Optional[re.Match]]:
+    """Classify a single (non-first) OCR line.
+
+    Args:
+        line: One line of OCR text, full-width digits folded (see _FULLWIDTH)
+
+    Returns:
+        Tuple of (line class, match object for the class pattern or None)
+    """
+    if not line.strip():
+        return LINE_BLANK, None
+    # Summary keywords are checked before the item pattern, since summary
+    # lines also look like "<label> <amount>円". A summary line may hold
+    # several labels ("小計 … 消費税 … 合計 …"); see _summary_matches.
+    if '小計' in line:
+        return LINE_SUBTOTAL, _SUBTOTAL_PATTERN.search(line)
+    if '消費税' in line:
+        return LINE_TAX, None
+    if '合計' in line:
+        return LINE_TOTAL, _TOTAL_PATTERN.search(line)
+    date_match = _DATE_PATTERN.search(line)
+    if date_match:
+        return LINE_HEADER, date_match
+    item_match = _ITEM_PATTERN.search(line)
+    if item_match:
+        return LINE_ITEM, item_match
+    return LINE_OTHER, None
+
+
+def _summary_matches(line: str) -> Tuple[Optional[re.Match], Optional[re.Match], bool]:
+    """Match subtotal and total independently on a summary line.
+
+    Returns:
+        Tuple of (subtotal match, total match, whether a label still waits
+        for its value on the next line)
+    """
+    subtotal = _SUBTOTAL_PATTERN.search(line)
+    total = _TOTAL_PATTERN.search(line)
+    waiting = ('小計' in line and not subtotal) or ('合計' in line and not total)
+    return subtotal, total, waiting
+
+
+def parse_invoice_data(raw_text: Union[str, Iterable[str]]) -> Dict[str, Any]:
     """Parse invoice data from raw OCR text.
-    
+
+    Lines are consumed one at a time and each is classified exactly once,
+    so OCR output can be streamed in (e.g. page by page) and parsing is
+    linear in the input size. A label line without a value is carried over
+    and joined with the next line when that line starts with the value.
+
     Args:
-        raw_text: Raw text extracted from PDF
-        
+        raw_text: Raw text extracted from PDF, or an iterable of lines
+
     Returns:
         Dictionary with parsed invoice data
     """
@@ -20,41 +94,51 @@ def parse_invoice_data(raw_text: str) -> Dict[str, Any]:
         'total_incl_tax': 0,
         'items': []
     }
-    
-    # Extract vendor name (first line typically)
-    lines = raw_text.strip().split('\n')
-    if lines:
-        result['vendor_name'] = lines[0].strip()
-    
-    # Extract estimate date
-    date_match = re.search(r'見積日[:\s：]+(\d{4}[-/]\d{1,2}[-/]\d{1,2})', raw_text)
-    if date_match:
-        result['estimate_date'] = date_match.group(1)
-    
-    # Extract items with amounts
-    item_pattern = r'(?:\d+\.\s+)?(.+?)\s+(\d{1,3}(?:,\d{3})*)円'
-    items = re.findall(item_pattern, raw_text)
-    
-    for item_name, amount_str in items:
-        item_name = item_name.strip()
-        amount = int(amount_str.replace(',', ''))
-        
-        # Skip total/subtotal lines
-        if any(keyword in item_name for keyword in ['小計', '合計', '消費税']):
+
+    lines = io.StringIO(raw_text) if isinstance(raw_text, str) else raw_text
+    seen_vendor = False
+    seen_subtotal = False
+    seen_total = False
+    # (line, folded line) still waiting for its value on a following line
+    carry = None
+
+    for line in lines:
+        # Vendor name: first non-empty line
+        if not seen_vendor:
+            if line.strip():
+                result['vendor_name'] = line.strip()
+                seen_vendor = True
             continue
-        
-        result['items'].append({
-            'item_name_raw': item_name,
-            'amount_excl_tax': amount
-        })
-    
-    # Extract totals
-    total_excl_match = re.search(r'小計[^\d]*(\d{1,3}(?:,\d{3})*)円', raw_text)
-    if total_excl_match:
-        result['total_excl_tax'] = int(total_excl_match.group(1).replace(',', ''))
-    
-    total_incl_match = re.search(r'合計[^\d]*(\d{1,3}(?:,\d{3})*)円', raw_text)
-    if total_incl_match:
-        result['total_incl_tax'] = int(total_incl_match.group(1).replace(',', ''))
-    
+
+        folded = line.translate(_FULLWIDTH)
+        if carry and _CONTINUATION_PATTERN.match(folded):
+            line, folded = carry[0] + '\n' + line, carry[1] + '\n' + folded
+        kind, match = classify_line(folded)
+        if kind == LINE_BLANK:
+            continue
+        subtotal = total = None
+        waiting = kind == LINE_OTHER
+        if kind in (LINE_SUBTOTAL, LINE_TAX, LINE_TOTAL):
+            subtotal, total, waiting = _summary_matches(folded)
+        carry = (line.rstrip('\n'), folded.rstrip('\n')) if waiting else None
+
+        if kind == LINE_ITEM:
+            # A line may carry more than one "<name> <amount>円" pair
+            while match:
+                result['items'].append({
+                    'item_name_raw': line[match.start(1):match.end(1)].strip(),
+                    'amount_excl_tax': _to_int(match.group(2))
+                })
+                match = _ITEM_PATTERN.search(folded, match.end())
+        elif kind == LINE_HEADER:
+            if not result['estimate_date']:
+                result['estimate_date'] = match.group(1)
+        elif kind in (LINE_SUBTOTAL, LINE_TAX, LINE_TOTAL):
+            if subtotal and not seen_subtotal:
+                result['total_excl_tax'] = _to_int(subtotal.group(1))
+                seen_subtotal = True
+            if total and not seen_total:
+                result['total_incl_tax'] = _to_int(total.group(1))
+                seen_total = True
+
     return result
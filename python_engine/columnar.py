@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Columnar export of extraction results (Arrow IPC / Parquet).
+
+Flattens result documents (the --pdf / --serve / --batch output shape) into
+one row per line item:
+
+    estimate_id, vendor_name, estimate_date, item_name_norm, cost_type,
+    amount_excl_tax, quantity
+
+String columns are dictionary-encoded, so repeated vendor names and
+normalized item names are stored once per batch. Requires pyarrow, which is
+imported only when a table is written.
+
+Usage:
+    python3 columnar.py results.jsonl --output items.parquet
+    python3 main.py --batch /path/to/estimates/ --format arrow --output items.arrow
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import date
+
+FORMATS = ('parquet', 'arrow')
+
+# Rows per record batch (and Parquet row group)
+BATCH_ROWS = 64 * 1024
+
+STRING_COLUMNS = ('estimate_id', 'vendor_name', 'item_name_norm', 'cost_type')
+
+COLUMNS = ('estimate_id', 'vendor_name', 'estimate_date', 'item_name_norm',
+           'cost_type', 'amount_excl_tax', 'quantity')
+
+
+def _schema(pa):
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('estimate_id', dictionary),
+        ('vendor_name', dictionary),
+        ('estimate_date', pa.date32()),
+        ('item_name_norm', dictionary),
+        ('cost_type', dictionary),
+        ('amount_excl_tax', pa.int64()),
+        ('quantity', pa.int64()),
+    ])
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _int_or_none(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_rows(results):
+    """
+    Yield one flat row (tuple in COLUMNS order) per line item.
+    Documents carrying an "error" are skipped.
+    """
+    for index, result in enumerate(results):
+        if not isinstance(result, dict) or result.get('error'):
+            continue
+        estimate_id = result.get('id') or result.get('source') or str(index)
+        vendor_name = result.get('vendor_name')
+        estimate_date = _parse_date(result.get('estimate_date'))
+        for item in result.get('items') or []:
+            yield (
+                str(estimate_id),
+                vendor_name,
+                estimate_date,
+                item.get('item_name_norm'),
+                item.get('cost_type'),
+                _int_or_none(item.get('amount_excl_tax')),
+                _int_or_none(item.get('quantity')),
+            )
+
+
+def iter_record_batches(results, batch_rows=BATCH_ROWS):
+    """
+    Group flattened rows into dictionary-encoded Arrow record batches.
+    """
+    import pyarrow as pa
+
+    schema = _schema(pa)
+    columns = [[] for _ in COLUMNS]
+
+    def flush():
+        arrays = []
+        for name, values in zip(COLUMNS, columns):
+            if name in STRING_COLUMNS:
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, schema.field(name).type))
+        for values in columns:
+            values.clear()
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    for row in iter_rows(results):
+        for values, value in zip(columns, row):
+            values.append(value)
+        if len(columns[0]) >= batch_rows:
+            yield flush()
+    if columns[0]:
+        yield flush()
+
+
+def write_columnar(results, path, fmt='parquet'):
+    """
+    Write results as a Parquet or Arrow IPC file; returns the number of rows.
+
+    Parquet is written one row group per batch, so memory stays bounded by
+    BATCH_ROWS. Arrow IPC files need one dictionary per column, so batches
+    are collected and their dictionaries unified before writing.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (available: {', '.join(FORMATS)})")
+    import pyarrow as pa
+
+    schema = _schema(pa)
+    rows = 0
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            for batch in iter_record_batches(results):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        return rows
+
+    table = pa.Table.from_batches(list(iter_record_batches(results)), schema=schema)
+    table = table.unify_dictionaries().combine_chunks()
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        writer.write_table(table)
+    return table.num_rows
+
+
+def iter_jsonl(path):
+    """
+    Read result documents from a JSONL file ('-' for stdin), skipping bad lines.
+    """
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                print(f"Skipping invalid line {line_no}: {e}", file=sys.stderr)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def format_for(path, fmt=None):
+    """
+    Pick the format from an explicit value or the output file extension.
+    """
+    if fmt:
+        return fmt
+    return 'arrow' if os.path.splitext(path)[1].lower() in ('.arrow', '.feather', '.ipc') else 'parquet'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert JSONL extraction results to Parquet / Arrow IPC')
+    parser.add_argument('input', help="JSONL results (e.g. from main.py --batch), or '-' for stdin")
+    parser.add_argument('--output', required=True, help='Output file (.parquet or .arrow)')
+    parser.add_argument('--format', choices=FORMATS, help='Default: from the output extension')
+    args = parser.parse_args()
+
+    try:
+        rows = write_columnar(iter_jsonl(args.input), args.output, format_for(args.output, args.format))
+    except ImportError as e:
+        print(f"pyarrow is required for columnar output: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"wrote {rows} items -> {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Fuzzy item-name index: character bigram MinHash with LSH banding.
+
+Maps a raw name that no dictionary rule matched (OCR variants such as
+"ワイパ-ブレ-ド" or "エアフイルター") to the closest known canonical name.
+Each known surface string gets a MinHash signature over its character
+bigrams; signatures are split into bands and every band is hashed into a
+sorted postings array. A lookup hashes its own bands, binary-searches the
+postings for candidates and scores only those by exact bigram Dice
+similarity, so its cost barely grows with the number of entries.
+
+A wrong merge corrupts price statistics worse than an unmatched name, so a
+match must also be unambiguous: names shorter than MIN_KEY_LENGTH are never
+matched (too few bigrams for the score to mean anything), the lengths must
+be close (OCR substitutes characters; "バッテリー点検" is not a variant of
+"バッテリー") and the best canonical name must beat the runner-up by MARGIN.
+
+The index is a flat file (written by `normalizer.py --compile`) that is
+memory-mapped at startup:
+
+    header    magic, version, num_perm, bands, rows, entries, postings, source stamp
+    keys      postings x u64 band hash (sorted)
+    ids       postings x u32 entry id
+    offsets   (entries + 1) x u32 into the string blob
+    blob      UTF-8 "surface\\x1fcanonical" per entry
+"""
+import os
+import re
+import mmap
+import struct
+import hashlib
+import tempfile
+import unicodedata
+from bisect import bisect_left
+
+MAGIC = b'FZIX'
+VERSION = 2
+NUM_PERM = 96
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+MIN_KEY_LENGTH = 4
+MIN_LENGTH_RATIO = 0.8
+MARGIN = 0.1
+
+HEADER = struct.Struct('<4sHHHHIIqq')
+HEADER_SIZE = 64
+# One extendable-output hash per bigram yields all NUM_PERM hash values at once
+_PERM_VALUES = struct.Struct(f'<{NUM_PERM}I')
+_BAND_TAGS = [struct.pack('<H', band) for band in range(BANDS)]
+
+# Hyphen-like characters OCR emits for the katakana long vowel mark
+_LONG_VOWEL = re.compile(r'(?<=[゠-ヿ])[-‐‑‒–—―−ｰ~〜～]')
+_SEPARATORS = re.compile(r'[\s_・/()\[\]（）「」]+')
+
+
+def fuzzy_key(text):
+    """
+    Canonical spelling used for fuzzy comparison: NFKC, lowercase, katakana
+    long vowels restored from hyphens, separators removed.
+    """
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = _LONG_VOWEL.sub('ー', text)
+    return _SEPARATORS.sub('', text)
+
+
+def bigrams(key):
+    if len(key) < 2:
+        return {key} if key else set()
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+def similarity(a, b):
+    """
+    Dice coefficient of two bigram sets.
+    """
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _signature(grams):
+    """
+    MinHash signature: per hash function, the minimum over the bigrams.
+    """
+    rows = [_PERM_VALUES.unpack(hashlib.shake_128(g.encode('utf-8')).digest(_PERM_VALUES.size)) for g in grams]
+    return _PERM_VALUES.pack(*map(min, zip(*rows)))
+
+
+def _band_keys(signature):
+    width = ROWS * 4
+    return [int.from_bytes(hashlib.blake2b(signature[band * width:(band + 1) * width] + tag,
+                                           digest_size=8).digest(), 'little')
+            for band, tag in enumerate(_BAND_TAGS)]
+
+
+def build_index(entries, source_stamp=(0, 0)):
+    """
+    Serialize (surface, canonical) entries into the index file format.
+    """
+    unique = sorted({(fuzzy_key(surface), canonical) for surface, canonical in entries
+                     if len(fuzzy_key(surface)) >= MIN_KEY_LENGTH})
+    postings = []
+    blob = bytearray()
+    offsets = [0]
+    for entry_id, (surface, canonical) in enumerate(unique):
+        for key in set(_band_keys(_signature(bigrams(surface)))):
+            postings.append((key, entry_id))
+        blob += f'{surface}\x1f{canonical}'.encode('utf-8')
+        offsets.append(len(blob))
+    postings.sort()
+
+    header = HEADER.pack(MAGIC, VERSION, NUM_PERM, BANDS, ROWS, len(unique), len(postings), *source_stamp)
+    return b''.join([
+        header.ljust(HEADER_SIZE, b'\0'),
+        struct.pack(f'<{len(postings)}Q', *(key for key, _ in postings)),
+        struct.pack(f'<{len(postings)}I', *(entry_id for _, entry_id in postings)),
+        struct.pack(f'<{len(offsets)}I', *offsets),
+        bytes(blob),
+    ])
+
+
+def atomic_write(path, data):
+    """
+    Replace path with data in one step: running workers may have the old
+    file mmapped (FuzzyIndex.open), and rewriting it in place would tear
+    their reads or raise SIGBUS.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def write_index(path, entries, source_stamp):
+    return atomic_write(path, build_index(entries, source_stamp))
+
+
+class FuzzyIndex:
+    """Read-only view over an index buffer (bytes or mmap)"""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, version, num_perm, bands, rows, entries, postings, mtime, size = HEADER.unpack_from(buffer, 0)
+        if (magic, version, num_perm, bands, rows) != (MAGIC, VERSION, NUM_PERM, BANDS, ROWS):
+            raise ValueError('Incompatible fuzzy index')
+        self.source_stamp = (mtime, size)
+        self.entries = entries
+        view = memoryview(buffer)
+        start = HEADER_SIZE
+        self._keys = view[start:start + 8 * postings].cast('Q')
+        start += 8 * postings
+        self._ids = view[start:start + 4 * postings].cast('I')
+        start += 4 * postings
+        self._offsets = view[start:start + 4 * (entries + 1)].cast('I')
+        self._blob = view[start + 4 * (entries + 1):]
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map an index file.
+        """
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _entry(self, entry_id):
+        raw = bytes(self._blob[self._offsets[entry_id]:self._offsets[entry_id + 1]])
+        surface, _, canonical = raw.decode('utf-8').partition('\x1f')
+        return surface, canonical
+
+    def lookup(self, text, threshold=0.6, margin=MARGIN):
+        """
+        Return (canonical, score) of the most similar entry with score >=
+        threshold, or None when there is none or another canonical name
+        scores within margin of it.
+        """
+        key = fuzzy_key(text)
+        if len(key) < MIN_KEY_LENGTH or not self.entries:
+            return None
+        grams = bigrams(key)
+
+        candidates = set()
+        keys = self._keys
+        for band_key in _band_keys(_signature(grams)):
+            position = bisect_left(keys, band_key)
+            while position < len(keys) and keys[position] == band_key:
+                candidates.add(self._ids[position])
+                position += 1
+
+        scores = {}
+        for entry_id in candidates:
+            surface, canonical = self._entry(entry_id)
+            if min(len(key), len(surface)) < MIN_LENGTH_RATIO * max(len(key), len(surface)):
+                continue
+            score = similarity(grams, bigrams(surface))
+            scores[canonical] = max(score, scores.get(canonical, 0.0))
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if not ranked or ranked[0][1] < threshold:
+            return None
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < margin:
+            return None
+        return ranked[0]
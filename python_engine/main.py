@@ -1,37 +1,16 @@
 #!/usr/bin/env python3
 import sys
 import json
+import io
 import os
 import argparse
 from datetime import date
 
-def normalize_item_name(raw_name):
-    """
-    Normalize item names according to MVP rules.
-    """
-    lower = raw_name.lower()
-    
-    # Wiper blade normalization
-    if any(keyword in lower for keyword in ['ワイパー', 'wiper', 'ブレード', 'blade']):
-        return 'wiper_blade'
-    
-    # Engine oil normalization
-    if any(keyword in lower for keyword in ['エンジンオイル', 'engine oil', 'oil']):
-        return 'engine_oil'
-    
-    # Default: use raw name with spaces replaced
-    return raw_name.lower().replace(' ', '_').replace('　', '_')
+# socketserver, concurrent.futures and price_index are imported by the modes
+# that use them, so a one-shot --pdf run starts close to bare interpreter time
+import columnar
 
-def determine_cost_type(item_name_raw):
-    """
-    Determine if item is parts or labor.
-    If name includes 工賃 or 'labor' or 'installation' -> labor
-    Otherwise -> parts
-    """
-    lower = item_name_raw.lower()
-    if any(keyword in lower for keyword in ['工賃', 'labor', 'installation', 'service']):
-        return 'labor'
-    return 'parts'
+from normalizer import classify_item, reload_if_changed, rules_version
 
 def parse_pdf(pdf_path):
     """
@@ -51,15 +30,16 @@ def parse_pdf(pdf_path):
         {"name": "エアフィルター", "amount": 2800}
     ]
     
+    dict_version = rules_version()
     items = []
     for raw_item in raw_items:
-        normalized = normalize_item_name(raw_item["name"])
-        cost_type = determine_cost_type(raw_item["name"])
+        normalized, cost_type = classify_item(raw_item["name"])
         items.append({
             "item_name_raw": raw_item["name"],
             "item_name_norm": normalized,
             "cost_type": cost_type,
-            "amount_excl_tax": raw_item["amount"]
+            "amount_excl_tax": raw_item["amount"],
+            "dict_version": dict_version
         })
     
     total_excl_tax = sum(item["amount_excl_tax"] for item in items)
@@ -75,14 +55,203 @@ def parse_pdf(pdf_path):
     
     return result
 
+def handle_request(line):
+    """
+    Handle one newline-delimited JSON request: {"pdf": path, "id": ...}.
+    Returns the parse_pdf result with the request id echoed back.
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {"id": None, "error": f"Invalid request: {e}"}
+
+    if not isinstance(request, dict) or not request.get('pdf'):
+        return {"id": None, "error": "Invalid request: 'pdf' is required"}
+
+    # Pick up dictionary edits without restarting the worker
+    reload_if_changed()
+    response = {"id": request.get('id')}
+    response.update(parse_pdf(request['pdf']))
+    return response
+
+def serve_stream(infile, outfile, price_index=None):
+    """
+    Read requests line by line and write one JSON result per line.
+    """
+    for line in infile:
+        if not line.strip():
+            continue
+        response = handle_request(line)
+        if price_index is not None:
+            price_index.add_result(response)
+        outfile.write(json.dumps(response, ensure_ascii=False) + '\n')
+        outfile.flush()
+
+def serve(socket_path=None, price_index=None):
+    """
+    Persistent worker mode. Reads requests from stdin, or from clients of a
+    Unix socket when socket_path is given, so imports are paid once.
+    """
+    if socket_path is None:
+        serve_stream(sys.stdin, sys.stdout, price_index)
+        return
+
+    import socketserver
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            infile = io.TextIOWrapper(self.rfile, encoding='utf-8')
+            outfile = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+            serve_stream(infile, outfile, self.server.price_index)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, RequestHandler) as server:
+        server.price_index = price_index
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+def parse_source(pdf_path):
+    """
+    Batch worker: parse one PDF and tag the result with its source path.
+    Errors are reported inline in the same {"error": ...} shape as parse_pdf.
+    """
+    try:
+        result = parse_pdf(pdf_path)
+    except Exception as e:
+        result = {"error": f"Failed to parse {pdf_path}: {e}"}
+    response = {"source": pdf_path}
+    response.update(result)
+    return response
+
+def iter_batch_sources(source):
+    """
+    Yield (pdf_path, error) pairs from a directory of PDFs or a JSONL manifest.
+    Manifest lines are {"pdf": path} objects or bare JSON strings.
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith('.pdf'):
+                yield os.path.join(source, name), None
+        return
+
+    with open(source, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                pdf_path = entry.get('pdf') if isinstance(entry, dict) else entry
+                if not isinstance(pdf_path, str):
+                    raise ValueError("'pdf' path is required")
+            except ValueError as e:
+                yield None, f"Invalid manifest line {line_no}: {e}"
+                continue
+            yield pdf_path, None
+
+def iter_batch_results(source, workers=None):
+    """
+    Parse every PDF in source across a process pool and yield results in
+    completion order. Only a bounded number of tasks is in flight at once.
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4
+    pending = set()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for pdf_path, error in iter_batch_sources(source):
+            if error:
+                yield {"source": None, "error": error}
+                continue
+            pending.add(executor.submit(parse_source, pdf_path))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def index_results(results, price_index=None):
+    """
+    Pass results through, adding each to price_index on the way.
+    """
+    for result in results:
+        if price_index is not None:
+            price_index.add_result(result)
+        yield result
+
+def run_batch(source, workers=None, outfile=sys.stdout, price_index=None):
+    """
+    Write batch results as JSONL, one line per PDF.
+    """
+    for result in index_results(iter_batch_results(source, workers), price_index):
+        outfile.write(json.dumps(result, ensure_ascii=False) + '\n')
+        outfile.flush()
+
 def main():
     parser = argparse.ArgumentParser(description='PDF Estimate Parser')
-    parser.add_argument('--pdf', required=True, help='Path to PDF file')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--pdf', help='Path to PDF file')
+    mode.add_argument('--serve', action='store_true',
+                      help='Serve newline-delimited JSON requests until EOF')
+    mode.add_argument('--batch', help='Directory of PDFs or JSONL manifest to parse in parallel')
+    parser.add_argument('--socket', help='Unix socket path for --serve (default: stdin/stdout)')
+    parser.add_argument('--workers', type=int, help='Worker processes for --batch (default: CPU count)')
+    parser.add_argument('--format', choices=('jsonl',) + columnar.FORMATS, default='jsonl',
+                        help='Output format for --batch (parquet/arrow flatten items into a table)')
+    parser.add_argument('--output', help='Output file for --format parquet/arrow')
+    parser.add_argument('--price-index', help='Add parsed items to this price index file (see price_index.py)')
     args = parser.parse_args()
+    if args.format != 'jsonl' and not (args.batch and args.output):
+        parser.error('--format parquet/arrow requires --batch and --output')
+
+    if args.batch:
+        # Report a missing or unreadable source before starting the pool
+        try:
+            if os.path.isdir(args.batch):
+                os.listdir(args.batch)
+            else:
+                open(args.batch, encoding='utf-8').close()
+        except OSError as e:
+            print(json.dumps({"error": f"Cannot read batch source {args.batch}: {e.strerror}"}), file=sys.stderr)
+            sys.exit(1)
+
+    price_index = None
+    if args.price_index:
+        from price_index import PriceIndex
+        price_index = PriceIndex(args.price_index)
+
+    if args.serve:
+        serve(args.socket, price_index)
+        sys.exit(0)
+    
+    if args.batch and args.format != 'jsonl':
+        try:
+            results = index_results(iter_batch_results(args.batch, args.workers), price_index)
+            rows = columnar.write_columnar(results, args.output, args.format)
+        except ImportError as e:
+            print(json.dumps({"error": f"--format {args.format} requires pyarrow: {e}"}), file=sys.stderr)
+            sys.exit(1)
+        print(f"wrote {rows} items -> {args.output}", file=sys.stderr)
+        sys.exit(0)
+
+    if args.batch:
+        run_batch(args.batch, args.workers, price_index=price_index)
+        sys.exit(0)
     
     result = parse_pdf(args.pdf)
+    if price_index is not None:
+        price_index.add_result(result)
     print(json.dumps(result, ensure_ascii=False, indent=2))
     sys.exit(0)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
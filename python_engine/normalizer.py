@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Rule-table-driven item name normalizer.
+
+Rules are loaded from a versioned JSON dictionary (normalization_rules.json).
+All keywords are compiled once into a single regex, so one scan of the
+(NFKC-folded, lowercased) item name yields both item_name_norm and cost_type.
+
+Names no rule matches are mapped to the closest known canonical name
+(long rule keywords and the dictionary's canonical_names) through a fuzzy
+bigram MinHash index (fuzzy_index.py), when similar enough and unambiguous.
+
+Build step (writes normalization_rules.pickle and normalization_rules.fuzzy
+next to the dictionary):
+    python3 normalizer.py --compile
+"""
+import os
+import sys
+import json
+import pickle
+import argparse
+from functools import lru_cache
+
+from fuzzy_index import FuzzyIndex, atomic_write, build_index, fuzzy_key, write_index
+from rule_matcher import KeywordMatcher, compile_keywords, fold
+
+RULES_PATH = os.environ.get('NORMALIZATION_RULES_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'normalization_rules.json'
+)
+
+INDEX_FORMAT = 3
+
+DEFAULT_FUZZY_THRESHOLD = 0.6
+# Rule keywords are substrings ("ブレード", "oil"), not names; only ones this
+# long (in fuzzy_key characters) are distinctive enough to be fuzzy targets
+FUZZY_MIN_KEYWORD_LENGTH = 6
+
+def _default_name(raw_name):
+    """
+    Default: use raw name with spaces replaced
+    """
+    return raw_name.lower().replace(' ', '_').replace('　', '_')
+
+def index_path(rules_path):
+    """
+    Path of the precompiled index for a rules dictionary.
+    """
+    return os.path.splitext(rules_path)[0] + '.pickle'
+
+def fuzzy_index_path(rules_path):
+    """
+    Path of the memory-mapped fuzzy name index for a rules dictionary.
+    """
+    return os.path.splitext(rules_path)[0] + '.fuzzy'
+
+def _validate_rules(rules):
+    """
+    Raise ValueError naming the first malformed part of a rules dictionary,
+    so a bad edit is rejected like unparseable JSON instead of raising
+    KeyError/TypeError from the middle of compilation.
+    """
+    if not isinstance(rules, dict):
+        raise ValueError('Invalid normalization rules: top level must be an object')
+    for key in ('item_name_rules', 'cost_type_rules'):
+        entries = rules.get(key, [])
+        if not isinstance(entries, list):
+            raise ValueError(f'Invalid normalization rules: {key} must be a list')
+        for i, rule in enumerate(entries):
+            where = f'{key}[{i}]'
+            if not isinstance(rule, dict):
+                raise ValueError(f'Invalid normalization rules: {where} must be an object')
+            if not isinstance(rule.get('name'), str) or not rule['name']:
+                raise ValueError(f'Invalid normalization rules: {where} needs a "name" string')
+            keywords = rule.get('keywords')
+            if not isinstance(keywords, list) or not all(isinstance(k, str) and k for k in keywords):
+                raise ValueError(f'Invalid normalization rules: {where} needs a "keywords" list of strings')
+            if not isinstance(rule.get('priority', 0), (int, float)):
+                raise ValueError(f'Invalid normalization rules: {where} "priority" must be a number')
+    names = rules.get('canonical_names', [])
+    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        raise ValueError('Invalid normalization rules: canonical_names must be a list of strings')
+    if not isinstance(rules.get('fuzzy_threshold', DEFAULT_FUZZY_THRESHOLD), (int, float)):
+        raise ValueError('Invalid normalization rules: fuzzy_threshold must be a number')
+
+class RuleMatcher(KeywordMatcher):
+    """
+    The dictionary's keyword matcher (rule_matcher.py) plus its version,
+    default cost type and fuzzy fallback entries.
+    """
+
+    def __init__(self, version, keywords, default_cost_type='parts', fuzzy_entries=(),
+                 fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD):
+        super().__init__(keywords)
+        self.version = version
+        self.default_cost_type = default_cost_type
+        # (surface, canonical name) pairs for the fuzzy fallback
+        self.fuzzy_entries = list(fuzzy_entries)
+        self.fuzzy_threshold = fuzzy_threshold
+
+    @classmethod
+    def from_rules(cls, rules):
+        """
+        Compile a parsed rules dictionary; raises ValueError if it is malformed.
+        """
+        _validate_rules(rules)
+        fuzzy_entries = [(keyword, rule['name'])
+                         for rule in rules.get('item_name_rules', []) for keyword in rule['keywords']
+                         if len(fuzzy_key(keyword)) >= FUZZY_MIN_KEYWORD_LENGTH]
+        fuzzy_entries += [(name, _default_name(name)) for name in rules.get('canonical_names', [])]
+
+        return cls(rules.get('version'), compile_keywords(rules), rules.get('default_cost_type', 'parts'),
+                   fuzzy_entries, rules.get('fuzzy_threshold', DEFAULT_FUZZY_THRESHOLD))
+
+    def to_index(self):
+        return {
+            'format': INDEX_FORMAT,
+            'version': self.version,
+            'keywords': self.keywords,
+            'default_cost_type': self.default_cost_type,
+            'fuzzy_entries': self.fuzzy_entries,
+            'fuzzy_threshold': self.fuzzy_threshold,
+        }
+
+def _source_stamp(rules_path):
+    st = os.stat(rules_path)
+    return (st.st_mtime_ns, st.st_size)
+
+def load_rules(rules_path=RULES_PATH):
+    """
+    Load the matcher from the precompiled index when it is up to date with
+    the dictionary, otherwise compile the JSON dictionary directly.
+    """
+    stamp = _source_stamp(rules_path)
+    try:
+        with open(index_path(rules_path), 'rb') as f:
+            index = pickle.load(f)
+        if index.get('format') == INDEX_FORMAT and index.get('source_stamp') == stamp:
+            return RuleMatcher(index['version'], index['keywords'], index['default_cost_type'],
+                               index['fuzzy_entries'], index['fuzzy_threshold']), stamp
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+        pass
+
+    with open(rules_path, encoding='utf-8') as f:
+        return RuleMatcher.from_rules(json.load(f)), stamp
+
+def compile_rules(rules_path=RULES_PATH):
+    """
+    Build step: write the precompiled index next to the dictionary.
+    """
+    with open(rules_path, encoding='utf-8') as f:
+        matcher = RuleMatcher.from_rules(json.load(f))
+    index = matcher.to_index()
+    index['source_stamp'] = _source_stamp(rules_path)
+    path = index_path(rules_path)
+    atomic_write(path, pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+    write_index(fuzzy_index_path(rules_path), matcher.fuzzy_entries, index['source_stamp'])
+    return path
+
+def load_fuzzy_index(matcher, stamp, rules_path=RULES_PATH):
+    """
+    Memory-map the compiled fuzzy index when it is up to date with the
+    dictionary, otherwise build it in memory.
+    """
+    try:
+        index = FuzzyIndex.open(fuzzy_index_path(rules_path))
+        if index.source_stamp == stamp:
+            return index
+    except (OSError, ValueError):
+        pass
+    return FuzzyIndex(build_index(matcher.fuzzy_entries, stamp))
+
+_matcher, _source = load_rules()
+_fuzzy = load_fuzzy_index(_matcher, _source)
+
+def reload_if_changed(rules_path=RULES_PATH):
+    """
+    Hot-reload the dictionary when its mtime/size changed. Returns True if reloaded.
+    """
+    global _matcher, _source, _fuzzy
+    try:
+        if _source_stamp(rules_path) == _source:
+            return False
+        _matcher, _source = load_rules(rules_path)
+        _fuzzy = load_fuzzy_index(_matcher, _source, rules_path)
+    except (OSError, ValueError) as e:
+        # Keep serving with the previous rules if the new file is unreadable
+        print(f"Failed to reload normalization rules: {e}", file=sys.stderr)
+        return False
+    classify_item.cache_clear()
+    return True
+
+def rules_version():
+    """
+    Version of the currently loaded dictionary.
+    """
+    return _matcher.version
+
+@lru_cache(maxsize=4096)
+def classify_item(raw_name):
+    """
+    Return (item_name_norm, cost_type) for a raw item name in a single scan.
+    Item names repeat heavily across estimates, so results are memoized.
+    """
+    name, cost = _matcher.match(fold(raw_name))
+    if name is None:
+        # Hyphens OCR reads for the long vowel mark ("ワイパ-ブレ-ド") hide
+        # rule keywords; fuzzy_key restores them
+        name = _matcher.match(fuzzy_key(raw_name))[0]
+    if name is None:
+        # OCR variants of known names: nearest canonical name, if similar enough
+        match = _fuzzy.lookup(raw_name, _matcher.fuzzy_threshold)
+        name = match[0] if match else _default_name(raw_name)
+    return name, cost or _matcher.default_cost_type
+
+def normalize_item_name(raw_name):
+    """
+    Normalize item names according to MVP rules.
+    """
+    return classify_item(raw_name)[0]
+
+def determine_cost_type(item_name_raw):
+    """
+    Determine if item is parts or labor.
+    If name includes 工賃 or 'labor' or 'installation' -> labor
+    Otherwise -> parts
+    """
+    return classify_item(item_name_raw)[1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Normalization dictionary tools')
+    parser.add_argument('--compile', action='store_true', help='Write the precompiled index')
+    parser.add_argument('--rules', default=RULES_PATH, help='Path to normalization_rules.json')
+    args = parser.parse_args()
+
+    if args.compile:
+        print(compile_rules(args.rules))
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Incremental, memory-mapped price index keyed by (item_name_norm, cost_type).
+
+Each key holds running count / sum / min / max of amount_excl_tax plus a
+log-bucketed quantile sketch (DDSketch-style: every value falls in bucket
+ceil(log_gamma(value)), so any quantile is within ALPHA relative error).
+Sketches merge by adding bucket counts, and a lookup reads one fixed-size
+slot, so it costs the same regardless of how many estimates were ingested.
+
+File layout (little-endian, standard library only):
+
+    header   magic "PIDX", version, bucket count, capacity, used, alpha,
+             key bytes used, key region size
+    slots    capacity x fixed-size slot, open addressing on a 64-bit key hash:
+             hash, key length, key offset, count, sum, min, max, buckets
+    keys     UTF-8 "item_name_norm\x1fcost_type" keys, stored whole, appended
+             in insertion order
+
+The index has a single writer; updates take an exclusive flock so --serve
+and --batch workers in other processes can share one file. Readers may mmap
+it concurrently.
+
+Usage:
+    python3 price_index.py --index prices.idx --rebuild results.jsonl [more.jsonl ...]
+    python3 price_index.py --index prices.idx --lookup wiper_blade parts
+    python3 main.py --batch /path/to/estimates/ --price-index prices.idx > results.jsonl
+"""
+import os
+import sys
+import json
+import math
+import mmap
+import struct
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b'PIDX'
+VERSION = 2
+ALPHA = 0.02
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+# Bucket 0 holds values below 1 yen; bucket 511 reaches ~7e8 yen
+BUCKETS = 512
+# Initial key region bytes per slot (keys are ~20-60 bytes; the region grows as needed)
+KEY_BYTES_PER_SLOT = 64
+MAX_LOAD = 0.7
+
+HEADER = struct.Struct('<4sHHIIdQQ')
+USED_OFFSET = 12
+KEYS_USED = struct.Struct('<Q')
+KEYS_USED_OFFSET = 24
+HEADER_SIZE = 64
+SLOT_HEAD = struct.Struct('<QIQQddd')
+BUCKET = struct.Struct('<I')
+SLOT_SIZE = SLOT_HEAD.size + BUCKETS * BUCKET.size
+
+
+def _key(item_name_norm, cost_type):
+    key = f'{item_name_norm}\x1f{cost_type or ""}'.encode('utf-8')
+    # 0 marks an empty slot
+    key_hash = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') | 1
+    return key_hash, key
+
+
+def bucket_index(value):
+    """
+    Sketch bucket for a value (values below 1 share bucket 0).
+    """
+    if value < 1:
+        return 0
+    return min(BUCKETS - 1, max(1, math.ceil(math.log(value, GAMMA))))
+
+
+def bucket_value(index):
+    """
+    Representative value of a bucket (within ALPHA of every value in it).
+    """
+    if index == 0:
+        return 0.0
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+class PriceIndex:
+    """Open (or create) a price index file"""
+
+    def __init__(self, path, capacity=1024):
+        self.path = path
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            self._create(path, 1 << max(4, (capacity - 1).bit_length()))
+        self._open()
+
+    @staticmethod
+    def _create(path, capacity, key_capacity=None):
+        key_capacity = key_capacity or capacity * KEY_BYTES_PER_SLOT
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, BUCKETS, capacity, 0, ALPHA, 0, key_capacity)
+                    .ljust(HEADER_SIZE, b'\0'))
+            f.truncate(HEADER_SIZE + capacity * SLOT_SIZE + key_capacity)
+        os.replace(tmp_path, path)
+
+    def _open(self):
+        self._file = open(self.path, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        if self._mm.size() < HEADER_SIZE or self._mm[:4] != MAGIC:
+            self.close()
+            raise ValueError(f"Not a compatible price index: {self.path}")
+        magic, version, buckets, self.capacity, _, alpha, _, self.key_capacity = HEADER.unpack_from(self._mm, 0)
+        if version != VERSION or buckets != BUCKETS or alpha != ALPHA:
+            self.close()
+            raise ValueError(f"Not a compatible price index (rebuild it with --rebuild): {self.path}")
+        self._keys_base = HEADER_SIZE + self.capacity * SLOT_SIZE
+
+    @property
+    def used(self):
+        return HEADER.unpack_from(self._mm, 0)[4]
+
+    @property
+    def keys_used(self):
+        return KEYS_USED.unpack_from(self._mm, KEYS_USED_OFFSET)[0]
+
+    def _slot_key(self, key_len, key_offset):
+        start = self._keys_base + key_offset
+        return self._mm[start:start + key_len]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _find(self, key_hash, key):
+        """
+        Offset of the key's slot, or of the empty slot where it would go.
+        """
+        mask = self.capacity - 1
+        index = key_hash & mask
+        while True:
+            offset = HEADER_SIZE + index * SLOT_SIZE
+            slot_hash, key_len, key_offset = SLOT_HEAD.unpack_from(self._mm, offset)[:3]
+            if slot_hash == 0 or (slot_hash == key_hash and self._slot_key(key_len, key_offset) == key):
+                return offset, slot_hash != 0
+            index = (index + 1) & mask
+
+    def _reload_if_replaced(self):
+        # Another writer may have grown the file (os.replace)
+        if os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino:
+            self.close()
+            self._open()
+
+    @contextmanager
+    def _writing(self):
+        """
+        Exclusive write access to the current file (retrying if it was
+        replaced by a grow or rebuild while we waited for the lock).
+        """
+        with self._lock:
+            while True:
+                self._reload_if_replaced()
+                if fcntl:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                if os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino:
+                    break
+                if fcntl:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            try:
+                yield
+                self._mm.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def add(self, item_name_norm, cost_type, amount, count=1):
+        """
+        Record count occurrences of one price.
+        """
+        self.add_many([(item_name_norm, cost_type, amount)] * count)
+
+    def add_many(self, entries):
+        """
+        Record (item_name_norm, cost_type, amount) entries under one lock.
+        """
+        with self._writing():
+            for item_name_norm, cost_type, amount in entries:
+                self._update(*_key(item_name_norm, cost_type), 1, float(amount), float(amount),
+                             float(amount), {bucket_index(amount): 1})
+
+    def add_result(self, result):
+        """
+        Ingest one parsed estimate (main.py output); returns the items recorded.
+        """
+        if not isinstance(result, dict) or result.get('error'):
+            return 0
+        entries = [(item['item_name_norm'], item.get('cost_type'), item['amount_excl_tax'])
+                   for item in result.get('items') or []
+                   if item.get('item_name_norm') and isinstance(item.get('amount_excl_tax'), (int, float))]
+        if entries:
+            self.add_many(entries)
+        return len(entries)
+
+    def _update(self, key_hash, key, count, total, low, high, buckets):
+        if self.used + 1 > self.capacity * MAX_LOAD or self.keys_used + len(key) > self.key_capacity:
+            self._grow(len(key))
+        offset, found = self._find(key_hash, key)
+        if found:
+            _, _, key_offset, old_count, old_total, old_low, old_high = SLOT_HEAD.unpack_from(self._mm, offset)
+            count += old_count
+            total += old_total
+            low = min(low, old_low)
+            high = max(high, old_high)
+        else:
+            key_offset = self.keys_used
+            start = self._keys_base + key_offset
+            self._mm[start:start + len(key)] = key
+            KEYS_USED.pack_into(self._mm, KEYS_USED_OFFSET, key_offset + len(key))
+            struct.pack_into('<I', self._mm, USED_OFFSET, self.used + 1)
+        SLOT_HEAD.pack_into(self._mm, offset, key_hash, len(key), key_offset, count, total, low, high)
+        base = offset + SLOT_HEAD.size
+        for index, n in buckets.items():
+            position = base + index * BUCKET.size
+            BUCKET.pack_into(self._mm, position, BUCKET.unpack_from(self._mm, position)[0] + n)
+
+    def _grow(self, key_len=0):
+        """
+        Rehash into a file with twice the slots (or just a larger key region,
+        when that is what ran out) and swap it in.
+        """
+        entries = list(self._iter_slots())
+        capacity = self.capacity * 2 if self.used + 1 > self.capacity * MAX_LOAD else self.capacity
+        key_capacity = max(self.key_capacity, capacity * KEY_BYTES_PER_SLOT)
+        while self.keys_used + key_len > key_capacity:
+            key_capacity *= 2
+        tmp_path = f'{self.path}.grow{os.getpid()}'
+        self._create(tmp_path, capacity, key_capacity)
+        grown = PriceIndex(tmp_path)
+        for key_hash, key, count, total, low, high, buckets in entries:
+            grown._update(key_hash, key, count, total, low, high, buckets)
+        grown._mm.flush()
+        # Lock the new file before it becomes visible, so the caller's
+        # exclusive access carries over the swap
+        if fcntl:
+            fcntl.flock(grown._file.fileno(), fcntl.LOCK_EX)
+        os.replace(tmp_path, self.path)
+        self.close()
+        self._file, self._mm = grown._file, grown._mm
+        self.capacity, self.key_capacity, self._keys_base = grown.capacity, grown.key_capacity, grown._keys_base
+
+    def _iter_slots(self):
+        for index in range(self.capacity):
+            offset = HEADER_SIZE + index * SLOT_SIZE
+            key_hash, key_len, key_offset, count, total, low, high = SLOT_HEAD.unpack_from(self._mm, offset)
+            if key_hash:
+                counts = struct.unpack_from(f'<{BUCKETS}I', self._mm, offset + SLOT_HEAD.size)
+                buckets = {i: n for i, n in enumerate(counts) if n}
+                yield key_hash, self._slot_key(key_len, key_offset), count, total, low, high, buckets
+
+    def merge(self, other):
+        """
+        Fold another index (e.g. one built on another host) into this one.
+        """
+        with self._writing():
+            for entry in other._iter_slots():
+                self._update(*entry)
+
+    def lookup(self, item_name_norm, cost_type, quantiles=(0.5, 0.9)):
+        """
+        Price summary for one key, or None if it was never seen.
+        """
+        # Read under the lock: a grow in this process swaps the mmap out
+        with self._lock:
+            self._reload_if_replaced()
+            offset, found = self._find(*_key(item_name_norm, cost_type))
+            if not found:
+                return None
+            _, _, _, count, total, low, high = SLOT_HEAD.unpack_from(self._mm, offset)
+            counts = struct.unpack_from(f'<{BUCKETS}I', self._mm, offset + SLOT_HEAD.size)
+        summary = {'count': count, 'sum': total, 'mean': total / count, 'min': low, 'max': high}
+        for q in quantiles:
+            summary[f'p{round(q * 100):g}'] = _quantile(counts, count, low, high, q)
+        return summary
+
+    def keys(self):
+        """
+        Return (item_name_norm, cost_type) for every key.
+        """
+        with self._lock:
+            self._reload_if_replaced()
+            keys = [key for _, key, *_ in self._iter_slots()]
+        return [tuple(key.decode('utf-8').partition('\x1f')[::2]) for key in keys]
+
+
+def _quantile(counts, total, low, high, q):
+    rank = q * (total - 1)
+    seen = 0
+    for index, n in enumerate(counts):
+        seen += n
+        if seen > rank:
+            # Exact at the extremes, within ALPHA in between
+            return min(max(bucket_value(index), low), high)
+    return high
+
+
+def rebuild(index_path, jsonl_paths):
+    """
+    Build a fresh index from JSONL result exports and swap it in atomically.
+    """
+    tmp_path = f'{index_path}.rebuild{os.getpid()}'
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+    items = 0
+    with PriceIndex(tmp_path) as index:
+        for path in jsonl_paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        try:
+                            items += index.add_result(json.loads(line))
+                        except ValueError:
+                            continue
+    os.replace(tmp_path, index_path)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental price index over normalized line items')
+    parser.add_argument('--index', required=True, help='Index file path')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--rebuild', nargs='+', metavar='JSONL', help='Rebuild from JSONL result exports')
+    action.add_argument('--lookup', nargs=2, metavar=('ITEM_NAME_NORM', 'COST_TYPE'))
+    action.add_argument('--dump', action='store_true', help='Print every key with its summary')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        items = rebuild(args.index, args.rebuild)
+        print(f"indexed {items} items -> {args.index}", file=sys.stderr)
+        return
+
+    with PriceIndex(args.index) as index:
+        if args.lookup:
+            print(json.dumps(index.lookup(*args.lookup), ensure_ascii=False))
+            return
+        for name, cost_type in index.keys():
+            summary = index.lookup(name, cost_type)
+            if summary is None:
+                # Removed by a concurrent --rebuild since the keys were listed
+                continue
+            print(json.dumps({'item_name_norm': name, 'cost_type': cost_type, **summary}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Vectorized price statistics over normalized line items.
+
+Computes, for every item_name_norm in one batch:
+
+    count, min, median, mean, p90     amount_excl_tax over all line items
+    by_cost_type                      the same per cost_type (parts / labor / ...),
+                                      i.e. the average PriceAnalysisService looks up
+    best_vendor, best_estimate_id,
+    best_single_total                 estimate with the lowest total for the item
+                                      (EstimatePriceQuery#calculate_single_vendor_best)
+    split_parts_min, split_labor_min,
+    split_total                       cheapest parts + cheapest labor across estimates
+                                      (EstimatePriceQuery#calculate_split_best)
+
+The last two groups map onto the kintone app 316 fields. Input is a
+columnar batch (a dict of columns, a pyarrow Table or a pandas DataFrame)
+with the columnar.py columns. Requires numpy, imported on first use.
+
+Usage:
+    python3 price_stats.py items.parquet > price_stats.json
+    python3 price_stats.py results.jsonl
+"""
+import sys
+import json
+import argparse
+
+import columnar
+
+QUANTILES = {'median': 0.5, 'p90': 0.9}
+
+
+def _column(batch, name, dtype=object):
+    import numpy as np
+
+    values = batch[name]
+    if hasattr(values, 'to_pylist'):
+        # pyarrow (Chunked)Array; dictionary columns decode to plain values
+        values = values.to_pylist()
+    return np.asarray(values, dtype=dtype)
+
+
+def columns_from_rows(rows):
+    """
+    Transpose columnar.iter_rows() tuples into a dict of columns.
+    """
+    columns = {name: [] for name in columnar.COLUMNS}
+    for row in rows:
+        for name, value in zip(columnar.COLUMNS, row):
+            columns[name].append(value)
+    return columns
+
+
+def _group_stats(codes, values, groups):
+    """
+    count/min/mean/quantiles of values (non-empty) per group code in [0, groups).
+    Empty groups get count 0 and NaN statistics.
+    """
+    import numpy as np
+
+    counts = np.bincount(codes, minlength=groups)
+    present = counts > 0
+    stats = {'count': counts}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats['mean'] = np.bincount(codes, weights=values, minlength=groups) / counts
+
+    # Sort by (group, value) once; each group is then a contiguous sorted run.
+    # Empty groups point past their neighbours' runs, so clamp and mask them.
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    first = np.minimum(np.searchsorted(codes[order], np.arange(groups)), len(values) - 1)
+    stats['min'] = np.where(present, sorted_values[first], np.nan)
+    for name, q in QUANTILES.items():
+        # Linear interpolation between closest ranks (numpy's default method)
+        position = first + np.maximum(counts - 1, 0) * q
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        value = sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+        stats[name] = np.where(present, value, np.nan)
+    return stats
+
+
+def compute_price_stats(batch):
+    """
+    Compute price statistics for every item_name_norm in batch.
+
+    Returns:
+        Dict keyed by item_name_norm (see module docstring for the fields)
+    """
+    import numpy as np
+
+    names = _column(batch, 'item_name_norm')
+    cost_types = _column(batch, 'cost_type')
+    estimate_ids = _column(batch, 'estimate_id')
+    vendors = _column(batch, 'vendor_name')
+    amounts = _column(batch, 'amount_excl_tax', dtype=float)
+
+    # Items without a name or amount carry no price information
+    keep = names.astype(bool) & ~np.isnan(amounts)
+    names, cost_types, estimate_ids, vendors, amounts = (
+        names[keep], cost_types[keep], estimate_ids[keep], vendors[keep], amounts[keep]
+    )
+    if not len(names):
+        return {}
+
+    item_keys, item_codes = np.unique(names.astype(str), return_inverse=True)
+    groups = len(item_keys)
+    overall = _group_stats(item_codes, amounts, groups)
+
+    cost_keys, cost_codes = np.unique(cost_types.astype(str), return_inverse=True)
+    by_cost = {}
+    for index, cost_type in enumerate(cost_keys):
+        mask = cost_codes == index
+        by_cost[cost_type] = _group_stats(item_codes[mask], amounts[mask], groups)
+
+    # Single vendor best: total per (item, estimate), then the cheapest estimate per item
+    estimate_keys, first_row, estimate_codes = np.unique(
+        estimate_ids.astype(str), return_index=True, return_inverse=True
+    )
+    estimate_vendor = vendors[first_row]
+    pairs, pair_codes = np.unique(item_codes * len(estimate_keys) + estimate_codes, return_inverse=True)
+    pair_totals = np.bincount(pair_codes, weights=amounts)
+    pair_items = pairs // len(estimate_keys)
+    order = np.lexsort((pair_totals, pair_items))
+    best_pair = order[np.searchsorted(pair_items[order], np.arange(groups))]
+    best_estimate = pairs[best_pair] % len(estimate_keys)
+
+    def split_min(cost_type):
+        stats = by_cost.get(cost_type)
+        if stats is None:
+            return np.zeros(groups)
+        return np.nan_to_num(stats['min'], nan=0.0)
+
+    parts_min = split_min('parts')
+    labor_min = split_min('labor')
+
+    def number(value, integer=False):
+        if np.isnan(value):
+            return None
+        return int(round(value)) if integer else round(float(value), 2)
+
+    def summary(stats, index):
+        return {
+            'count': int(stats['count'][index]),
+            'min': number(stats['min'][index], integer=True),
+            'median': number(stats['median'][index]),
+            'mean': number(stats['mean'][index]),
+            'p90': number(stats['p90'][index]),
+        }
+
+    result = {}
+    for index, item_name_norm in enumerate(item_keys):
+        entry = summary(overall, index)
+        entry['by_cost_type'] = {
+            cost_type: summary(stats, index)
+            for cost_type, stats in by_cost.items() if stats['count'][index]
+        }
+        entry.update({
+            'best_vendor': estimate_vendor[best_estimate[index]],
+            'best_estimate_id': estimate_keys[best_estimate[index]],
+            'best_single_total': int(round(pair_totals[best_pair[index]])),
+            'split_parts_min': int(parts_min[index]),
+            'split_labor_min': int(labor_min[index]),
+            'split_total': int(parts_min[index] + labor_min[index]),
+        })
+        result[str(item_name_norm)] = entry
+    return result
+
+
+def load_batch(path):
+    """
+    Load a columnar batch from Parquet / Arrow IPC (pyarrow) or JSONL results.
+    """
+    if path == '-' or path.endswith('.jsonl'):
+        return columns_from_rows(columnar.iter_rows(columnar.iter_jsonl(path)))
+
+    import pyarrow as pa
+
+    if columnar.format_for(path) == 'arrow':
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all()
+    import pyarrow.parquet as pq
+    return pq.read_table(path, columns=list(columnar.COLUMNS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-item price statistics over normalized line items')
+    parser.add_argument('input', help="Parquet / Arrow IPC from columnar.py, or JSONL results ('-' for stdin)")
+    args = parser.parse_args()
+
+    try:
+        stats = compute_price_stats(load_batch(args.input))
+    except ImportError as e:
+        print(json.dumps({"error": f"price_stats requires numpy (and pyarrow for Parquet/Arrow): {e}"}),
+              file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
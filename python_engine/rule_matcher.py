@@ -0,0 +1,73 @@
+"""
+Single-scan keyword matcher shared by the rule-driven normalizers
+(normalizer.py here and the generated MVP engine's normalizer.py).
+
+Every keyword of every rule is compiled into one zero-width lookahead
+alternation (longest first), so the scan reports the longest keyword
+starting at each position. Each keyword also carries the targets of any
+shorter keywords that are its prefix, which makes the single scan
+equivalent to testing every keyword.
+"""
+import re
+import unicodedata
+
+# (kind reported by match(), rules dictionary key)
+RULE_KINDS = (('name', 'item_name_rules'), ('cost', 'cost_type_rules'))
+
+
+def fold(text):
+    """
+    Fold full-width/half-width variants (NFKC) and case.
+    """
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def compile_keywords(rules):
+    """
+    Build the keyword -> {kind: (rank, target)} table for a rules dictionary
+    ({"item_name_rules": [{"name", "priority", "keywords"}, ...], ...}).
+    Lower (priority, rule order) ranks win.
+    """
+    targets = {}
+    for kind, key in RULE_KINDS:
+        for order, rule in enumerate(rules.get(key, [])):
+            rank = (rule.get('priority', 0), order)
+            for keyword in rule['keywords']:
+                targets.setdefault(fold(keyword), []).append((kind, rank, rule['name']))
+
+    keywords = {}
+    for keyword in targets:
+        merged = {}
+        for other, entries in targets.items():
+            if not keyword.startswith(other):
+                continue
+            for kind, rank, target in entries:
+                if kind not in merged or rank < merged[kind][0]:
+                    merged[kind] = (rank, target)
+        keywords[keyword] = merged
+    return keywords
+
+
+class KeywordMatcher:
+    """
+    Matches every keyword of a compile_keywords() table in one regex scan.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = keywords
+        alternation = '|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+        self.pattern = re.compile(f'(?=({alternation}))') if alternation else None
+
+    def match(self, text):
+        """
+        Return (item_name_norm or None, cost_type or None) for folded text.
+        """
+        best = {}
+        if self.pattern is not None:
+            for m in self.pattern.finditer(text):
+                for kind, (rank, target) in self.keywords[m.group(1)].items():
+                    if kind not in best or rank < best[kind][0]:
+                        best[kind] = (rank, target)
+        name = best['name'][1] if 'name' in best else None
+        cost = best['cost'][1] if 'cost' in best else None
+        return name, cost
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+HTTP front-end for the parsing engine (standard library asyncio).
+
+    POST /parse   multipart/form-data upload (field "file") or JSON
+                  {"pdf": "/shared/volume/path.pdf"}; add "vision": true (or
+                  ?vision=1) to run the Azure OpenAI Vision extraction instead
+                  of parse_pdf.
+    GET  /health  {"status": "ok", ...} with the current queue depth.
+
+Parsing runs in a warm process pool; each worker process keeps one
+AzureOpenAIClient (and its pooled HTTP connections) for its lifetime.
+At most --workers requests run at once and --queue more wait; anything
+beyond that is rejected with 429 and a Retry-After header before its body
+is read, so rejected uploads cost no memory. Unexpected failures answer
+500 with a JSON error; if a worker process dies, the pool is replaced and
+the request gets 503.
+
+Usage:
+    python3 server.py --host 0.0.0.0 --port 8080 --workers 4 --queue 16
+"""
+import os
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+import tempfile
+from email import policy
+from email.parser import BytesParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qs
+
+from main import parse_pdf
+from normalizer import reload_if_changed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           411: 'Length Required', 413: 'Payload Too Large', 415: 'Unsupported Media Type',
+           429: 'Too Many Requests', 500: 'Internal Server Error', 502: 'Bad Gateway',
+           503: 'Service Unavailable'}
+
+# One Vision client per worker process, created on first use
+_vision_client = None
+
+
+def _get_vision_client():
+    """
+    Build the worker's AzureOpenAIClient on first use; None if unavailable.
+    """
+    global _vision_client
+    if _vision_client is None:
+        if ROOT not in sys.path:
+            sys.path.insert(0, ROOT)
+        from django_ocr.utils.azure_openai_client import AzureOpenAIClient
+        _vision_client = AzureOpenAIClient()
+    return _vision_client if _vision_client.configured else None
+
+
+def run_job(pdf_path, vision=False, request_id=None):
+    """
+    Process pool task: returns (status, result).
+    """
+    if not os.path.exists(pdf_path):
+        return 404, {"error": f"File not found: {pdf_path}"}
+    try:
+        if not vision:
+            reload_if_changed()
+            return 200, parse_pdf(pdf_path)
+
+        try:
+            client = _get_vision_client()
+        except ImportError as e:
+            return 503, {"error": f"Vision extraction unavailable: {e}"}
+        if client is None:
+            return 503, {"error": "Vision extraction unavailable: Azure OpenAI credentials not configured"}
+        result = client.extract_invoice_items_from_image(pdf_path, request_id=request_id)
+        if result is None:
+            return 502, {"error": "Vision extraction failed"}
+        return 200, result
+    except Exception as e:
+        return 500, {"error": f"Failed to parse {pdf_path}: {e}"}
+
+
+def _warm_worker():
+    """
+    Process pool initializer: pay the imports before the first request.
+    """
+    reload_if_changed()
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _save_upload(content_type, body):
+    """
+    Extract the "file" part of a multipart body into a temporary PDF.
+    """
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body
+    )
+    if not message.is_multipart():
+        raise HttpError(400, "Malformed multipart body")
+    for part in message.iter_parts():
+        if part.get_param('name', header='content-disposition') == 'file':
+            data = part.get_payload(decode=True) or b''
+            suffix = os.path.splitext(part.get_filename() or '')[1] or '.pdf'
+            fd, path = tempfile.mkstemp(prefix='ocr-upload-', suffix=suffix)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            return path
+    raise HttpError(400, "Multipart field 'file' is required")
+
+
+class ParseServer:
+    """
+    Admission control and HTTP/1.1 keep-alive handling around the process pool.
+    """
+
+    def __init__(self, workers, queue_size, max_body, data_root=None):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.max_body = max_body
+        self.data_root = os.path.realpath(data_root) if data_root else None
+        self.pending = 0
+        self.slots = asyncio.Semaphore(workers)
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                    break
+                if not request_line.strip():
+                    break
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        except Exception as e:
+            # Anything _handle_request could not turn into a response
+            print(f"Connection failed: {e!r}", file=sys.stderr)
+            try:
+                await self._respond(writer, 500, {"error": f"Internal error: {e}"}, keep_alive=False)
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line, reader, writer):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self._respond(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+            return False
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+        # Body bytes still on the wire (None: unknown); any left over would be
+        # parsed as the next request, so the connection must close
+        unread = None
+        admitted = False
+        try:
+            url = self._route(method, target)
+            unread = self._content_length(headers)
+            if url.path == '/parse':
+                # Backpressure before reading the body, so rejected uploads never reach memory
+                if self.pending >= self.capacity:
+                    raise HttpError(429, "Server busy, retry later", {'Retry-After': '1'})
+                self.pending += 1
+                admitted = True
+            body = await reader.readexactly(unread) if unread else b''
+            unread = 0
+            status, result, extra = await self._dispatch(url, headers, body)
+        except HttpError as e:
+            status, result, extra = e.status, {"error": str(e)}, e.headers
+            keep_alive = keep_alive and unread == 0
+        except asyncio.IncompleteReadError:
+            # Client went away mid-body
+            return False
+        except BrokenProcessPool:
+            # A worker died; _dispatch has already replaced the pool
+            status, result, extra = 503, {"error": "Worker pool restarted, retry later"}, {'Retry-After': '1'}
+            keep_alive = keep_alive and unread == 0
+        except Exception as e:
+            print(f"Request failed: {e!r}", file=sys.stderr)
+            status, result, extra = 500, {"error": f"Internal error: {e}"}, {}
+            keep_alive = keep_alive and unread == 0
+        finally:
+            if admitted:
+                self.pending -= 1
+        await self._respond(writer, status, result, keep_alive, extra)
+        return keep_alive
+
+    def _route(self, method, target):
+        url = urlsplit(target)
+        if url.path == '/health':
+            return url
+        if url.path != '/parse':
+            raise HttpError(404, f"Unknown path: {url.path}")
+        if method != 'POST':
+            raise HttpError(405, "Use POST /parse")
+        return url
+
+    def _content_length(self, headers):
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HttpError(411, "Chunked uploads are not supported; send Content-Length")
+        value = headers.get('content-length') or '0'
+        if not (value.isascii() and value.isdigit()):
+            raise HttpError(400, f"Invalid Content-Length: {value!r}")
+        length = int(value)
+        if length > self.max_body:
+            raise HttpError(413, f"Request body exceeds {self.max_body} bytes")
+        return length
+
+    async def _dispatch(self, url, headers, body):
+        if url.path == '/health':
+            return 200, {"status": "ok", "pending": self.pending, "capacity": self.capacity}, {}
+
+        request_id = headers.get('x-request-id') or uuid.uuid4().hex[:12]
+        vision = parse_qs(url.query).get('vision', ['0'])[0].lower() in ('1', 'true', 'yes')
+        upload = None
+        try:
+            content_type = headers.get('content-type', '')
+            loop = asyncio.get_running_loop()
+            if content_type.startswith('multipart/form-data'):
+                upload = await loop.run_in_executor(None, _save_upload, content_type, body)
+                pdf_path = upload
+            elif content_type.startswith('application/json'):
+                pdf_path, vision = self._shared_path(body, vision)
+            else:
+                raise HttpError(415, "Send multipart/form-data or application/json")
+
+            async with self.slots:
+                executor = self.executor
+                try:
+                    status, result = await loop.run_in_executor(
+                        executor, run_job, pdf_path, vision, request_id
+                    )
+                except BrokenProcessPool:
+                    self._replace_pool(executor)
+                    raise
+            return status, result, {'X-Request-ID': request_id}
+        finally:
+            if upload:
+                os.unlink(upload)
+
+    def _replace_pool(self, broken):
+        """
+        Swap in a fresh process pool once per broken one.
+        """
+        if self.executor is broken:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _shared_path(self, body, vision):
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError as e:
+            raise HttpError(400, f"Invalid request: {e}")
+        if not isinstance(request, dict) or not isinstance(request.get('pdf'), str):
+            raise HttpError(400, "Invalid request: 'pdf' is required")
+        pdf_path = request['pdf']
+        if self.data_root:
+            pdf_path = os.path.realpath(os.path.join(self.data_root, pdf_path))
+            if os.path.commonpath([pdf_path, self.data_root]) != self.data_root:
+                raise HttpError(400, "Invalid request: 'pdf' is outside the data root")
+        return pdf_path, bool(request.get('vision', vision))
+
+    async def _respond(self, writer, status, result, keep_alive, headers=None):
+        payload = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        head = [f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+                'Content-Type: application/json; charset=utf-8',
+                f'Content-Length: {len(payload)}',
+                f'Connection: {"keep-alive" if keep_alive else "close"}']
+        head += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+        await writer.drain()
+
+
+async def serve(host, port, workers, queue_size, max_body, data_root=None):
+    app = ParseServer(workers, queue_size, max_body, data_root)
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"Listening on http://{host}:{port} ({workers} workers, queue {queue_size})", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.executor.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP front-end for the PDF Estimate Parser')
+    parser.add_argument('--host', default=os.getenv('OCR_SERVER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('OCR_SERVER_PORT', '8080')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('OCR_SERVER_WORKERS', '0')) or os.cpu_count() or 1,
+                        help='Worker processes (default: CPU count)')
+    parser.add_argument('--queue', type=int, default=int(os.getenv('OCR_SERVER_QUEUE', '16')),
+                        help='Requests allowed to wait for a worker before returning 429')
+    parser.add_argument('--max-body', type=int, default=50 * 1024 * 1024, help='Maximum upload size in bytes')
+    parser.add_argument('--data-root', default=os.getenv('OCR_SERVER_DATA_ROOT'),
+                        help='Resolve JSON "pdf" paths under this shared volume and reject others')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue, args.max_body, args.data_root))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
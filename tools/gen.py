@@ -1,4 +1,5 @@
-import os, json, sys, time
+import os, json, sys, time, random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from anthropic import Anthropic
 
@@ -38,6 +39,11 @@ Rules:
 
 DEFAULT_MODEL = "claude-sonnet-4-5-20250929"
 BATCH_SIZE = 8
+DEFAULT_CONCURRENCY = int(os.getenv("GEN_CONCURRENCY", "4"))
+ATTEMPTS = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_REQUEST = "The previous output was invalid JSON. Return ONLY valid JSON for these paths. No markdown. Ensure all strings are closed."
 
 def safe_rel_path(p: str) -> str:
     p = (p or "").strip().lstrip("/").replace("\\", "/")
@@ -85,6 +91,43 @@ def call_model(client: Anthropic, model: str, system: str, user: str, max_tokens
 
     return text
 
+def backoff_delay(attempt: int) -> float:
+    # Full jitter: concurrent batches that fail together do not retry in lockstep
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def generate_batch(client: Anthropic, model: str, prompt: str, batch: list[str], dump_path: Path) -> list[dict]:
+    user_req = {
+        "instruction": prompt,
+        "request": "Generate file contents for the following paths only.",
+        "paths": batch
+    }
+    for attempt in range(ATTEMPTS):
+        try:
+            text = call_model(
+                client=client,
+                model=model,
+                system=SYSTEM_FILES,
+                user=json.dumps(user_req, ensure_ascii=False),
+                max_tokens=7000,
+                dump_path=dump_path,
+            )
+            files = parse_json(text).get("files", [])
+            if not files:
+                raise ValueError("No files returned for batch: " + str(batch))
+            # An unsafe path is bad model output like any other: retry the batch
+            for f in files:
+                safe_rel_path(f.get("path"))
+            return files
+        # parse_json exits on unparseable output; here that is a retryable failure
+        except (Exception, SystemExit) as e:
+            if attempt == ATTEMPTS - 1:
+                raise RuntimeError(f"batch {batch[0]}..: {e}") from e
+            user_req["request"] = RETRY_REQUEST
+            delay = backoff_delay(attempt)
+            reason = " ".join(str(e).split())[:200]
+            print(f"retry {attempt + 1}/{ATTEMPTS - 1} in {delay:.1f}s ({batch[0]}..): {reason}", file=sys.stderr)
+            time.sleep(delay)
+
 def main():
     api_key = os.getenv("ANTHROPIC_API_KEY")
     model = os.getenv("ANTHROPIC_MODEL", DEFAULT_MODEL)
@@ -92,9 +135,10 @@ def main():
         raise SystemExit("ANTHROPIC_API_KEY not set")
 
     if len(sys.argv) < 2:
-        raise SystemExit('Usage: python tools/gen.py "instruction" --out generated/xxx')
+        raise SystemExit('Usage: python tools/gen.py "instruction" --out generated/xxx [--concurrency N]')
 
     out_dir = "generated/project"
+    concurrency = DEFAULT_CONCURRENCY
     args = sys.argv[1:]
     prompt_parts = []
     i = 0
@@ -102,6 +146,9 @@ def main():
         if args[i] == "--out":
             out_dir = args[i+1]
             i += 2
+        elif args[i] == "--concurrency":
+            concurrency = max(1, int(args[i+1]))
+            i += 2
         else:
             prompt_parts.append(args[i])
             i += 1
@@ -133,43 +180,33 @@ def main():
         encoding="utf-8"
     )
 
-    # 2) FILES in batches
+    # 2) FILES in batches, generated concurrently and written as each one lands
     paths = [safe_rel_path(x.get("path")) for x in file_specs if x.get("path")]
     total = len(paths)
     wrote = 0
+    failed = []
+    batches = {start: paths[start:start+BATCH_SIZE] for start in range(0, total, BATCH_SIZE)}
 
-    for start in range(0, total, BATCH_SIZE):
-        batch = paths[start:start+BATCH_SIZE]
-        user_req = {
-            "instruction": prompt,
-            "request": "Generate file contents for the following paths only.",
-            "paths": batch
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(generate_batch, client, model, prompt, batch, raw_dir / f"batch_{start}.txt"): start
+            for start, batch in batches.items()
         }
-
-        for attempt in range(2):
+        for future in as_completed(futures):
+            start = futures[future]
             try:
-                text = call_model(
-                    client=client,
-                    model=model,
-                    system=SYSTEM_FILES,
-                    user=json.dumps(user_req, ensure_ascii=False),
-                    max_tokens=7000,
-                    dump_path=raw_dir / f"batch_{start}.txt",
-                )
-                data = parse_json(text)
-                files = data.get("files", [])
-                if not files:
-                    raise ValueError("No files returned for batch: " + str(batch))
+                files = future.result()
                 write_files(out_root, files)
-                wrote += len(files)
-                break
             except Exception as e:
-                if attempt == 1:
-                    raise
-                user_req["request"] = "The previous output was invalid JSON. Return ONLY valid JSON for these paths. No markdown. Ensure all strings are closed."
-                time.sleep(0.5)
+                failed.append(start)
+                print(f"❌ {e}", file=sys.stderr)
+                continue
+            wrote += len(files)
+            print(f"batch {start // BATCH_SIZE + 1}/{len(batches)}: wrote {len(files)} files", file=sys.stderr)
 
     print(f"✅ manifest {total} files | wrote {wrote} files -> {out_root}")
+    if failed:
+        raise SystemExit("Failed batches: " + ", ".join(str(batches[start]) for start in sorted(failed)))
 
 if __name__ == "__main__":
     main()